@@ -2,11 +2,23 @@ import requests
 from requests.adapters import HTTPAdapter
 from urllib3.util.retry import Retry
 import json
+import fnmatch
+import functools
+import gzip
+import io
 import os
 import sys
 from pathlib import Path
 import urllib3
 import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+
+# Se utiliza orjson si esta disponible (serializacion mas rapida), con respaldo en json
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 # Se deshabilitan las advertencias de SSL para conexiones a traves de ngrok
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
@@ -27,8 +39,33 @@ BASE_PATH = Path("/Users/ivan/Library/Mobile Documents/com~apple~CloudDocs/ENDLE
 DIR_INPUT = BASE_PATH / "input"
 DIR_OUTPUT = BASE_PATH / "output"
 
-# Se configura el intervalo de consulta en segundos
-INTERVALO_POLLING = 10
+# Se define si se verifica el certificado SSL (la URL actual de ngrok usa http, por lo que no aplica)
+VERIFICAR_SSL = False
+
+# Se configura el intervalo de consulta en segundos (crece exponencialmente hasta el maximo)
+INTERVALO_POLLING_INICIAL = 0.5
+INTERVALO_POLLING_MAXIMO = 30.0
+FACTOR_POLLING = 1.5
+
+# Se define el tamano del buffer de escritura (1 MiB) para reducir llamadas al sistema
+TAMANO_BUFFER_ESCRITURA = 1024 * 1024
+
+# Se define el numero de hilos para escribir archivos en paralelo
+MAX_HILOS_ESCRITURA = 4
+
+# Se define el numero de hilos para leer archivos JSON de entrada en paralelo
+MAX_HILOS_LECTURA = 8
+
+# Se definen las etiquetas con las que la API identifica cada archivo de la Fase 1
+ETIQUETAS_FASE1 = ("INGRESOS", "EGRESOS", "DATOS")
+
+# Se definen los sufijos que se agregan a los nombres de archivo en cada fase
+SUFIJO_MODIFICADO = "_MODIFICADO.json"
+SUFIJO_CON_GIROS = "_CON_GIROS.json"
+SUFIJO_PERFIL = "_PERFIL.json"
+
+# Se comprimen con gzip los cuerpos multipart de Fase 2 y 3 (solo si la API acepta Content-Encoding: gzip)
+COMPRIMIR_ENVIOS = False
 
 # Funciones de utilidad
 
@@ -36,6 +73,9 @@ def crear_sesion_robusta():
     # Se crea una sesion HTTP con reintentos automaticos y configuracion para conexiones de larga duracion a traves de ngrok
     sesion = requests.Session()
     
+    # Se define una sola vez la verificacion SSL para todas las peticiones de la sesion
+    sesion.verify = VERIFICAR_SSL
+    
     # Se configuran headers para mantener la conexion viva durante procesos largos
     sesion.headers.update({
         'Connection': 'keep-alive',
@@ -64,27 +104,104 @@ def confirmar_continuacion(mensaje):
         print("Se detiene el proceso por solicitud del usuario.")
         sys.exit()
 
-def guardar_json_output(nombre, datos):
-    # Se guarda el archivo JSON generado en el directorio de salida
+def serializar_json(datos):
+    # Se serializan los datos a bytes UTF-8 listos para escribir o enviar
+    if orjson is not None:
+        return orjson.dumps(datos, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS)
+    return json.dumps(datos, indent=2, ensure_ascii=False).encode('utf-8')
+
+def escribir_bytes_output(nombre, contenido):
+    # Se escriben los bytes ya serializados en el directorio de salida
+    # Se escribe primero a un temporal y se renombra para no dejar archivos a medias
     ruta_completa = DIR_OUTPUT / nombre
-    with open(ruta_completa, 'w', encoding='utf-8') as f:
-        json.dump(datos, f, indent=4, ensure_ascii=False)
+    ruta_temporal = ruta_completa.with_name(ruta_completa.name + ".tmp")
+    with open(ruta_temporal, 'wb', buffering=TAMANO_BUFFER_ESCRITURA) as f:
+        f.write(contenido)
+    os.replace(ruta_temporal, ruta_completa)
     print(f"Archivo guardado en OUTPUT: {nombre}")
 
+def guardar_json_output(nombre, datos):
+    # Se guarda el archivo JSON generado en el directorio de salida
+    # Se devuelven los bytes escritos para poder reenviarlos sin releer el disco
+    contenido = serializar_json(datos)
+    escribir_bytes_output(nombre, contenido)
+    return contenido
+
+def preparar_envio(nombre, datos, contenidos_en_memoria, pool_escritura):
+    # Se serializa una sola vez: el envio usa los bytes en memoria y la copia en OUTPUT se escribe en segundo plano
+    contenido = serializar_json(datos)
+    contenidos_en_memoria[nombre] = contenido
+    return pool_escritura.submit(escribir_bytes_output, nombre, contenido)
+
+def esperar_escrituras(escrituras_pendientes):
+    # Se espera a que terminen las escrituras en segundo plano y se propagan sus errores
+    # Se llama antes de cada confirmacion para que los errores y mensajes salgan en orden
+    for escritura in escrituras_pendientes:
+        escritura.result()
+    escrituras_pendientes.clear()
+
+def etiqueta_archivo(clave):
+    # Se obtiene la primera etiqueta contenida en la clave, o None si no tiene ninguna
+    return next((etiqueta for etiqueta in ETIQUETAS_FASE1 if etiqueta in clave), None)
+
+def agregar_sufijo(nombre, sufijo):
+    # Se sustituye solo la extension final .json por el sufijo indicado
+    return Path(nombre).stem + sufijo
+
+def abrir_archivo_envio(nombre_archivo, contenidos_en_memoria):
+    # Se usa la copia en memoria si existe; solo se lee del disco lo que viene de INPUT
+    if nombre_archivo in contenidos_en_memoria:
+        return io.BytesIO(contenidos_en_memoria[nombre_archivo])
+    
+    # Se determina la ruta origen (Input o Output) para evitar duplicados
+    ruta = DIR_OUTPUT / nombre_archivo
+    if not ruta.exists():
+        ruta = DIR_INPUT / nombre_archivo
+    return open(ruta, 'rb')
+
+def deserializar_json(contenido):
+    # Se convierten los bytes UTF-8 a objetos de Python
+    if orjson is not None:
+        return orjson.loads(contenido)
+    return json.loads(contenido)
+
+def cargar_jsons_input(rutas, contenidos_en_memoria):
+    # Se leen y decodifican los archivos en paralelo, conservando los bytes para el envio
+    def cargar(ruta):
+        contenido = ruta.read_bytes()
+        return ruta.name, contenido, deserializar_json(contenido)
+    
+    with ThreadPoolExecutor(max_workers=MAX_HILOS_LECTURA) as pool_lectura:
+        cargados = list(pool_lectura.map(cargar, rutas))
+    
+    resultado = []
+    for nombre, contenido, datos in cargados:
+        contenidos_en_memoria[nombre] = contenido
+        resultado.append((nombre, datos))
+    return resultado
+
+@functools.lru_cache(maxsize=1)
+def listar_input():
+    # Se lee una sola vez el contenido del directorio de entrada (solo se escribe en OUTPUT)
+    # Se omiten los archivos ocultos, igual que glob
+    if not DIR_INPUT.exists():
+        return []
+    with os.scandir(DIR_INPUT) as entradas:
+        return [entrada.name for entrada in entradas if not entrada.name.startswith('.')]
+
 def buscar_archivos_input(patrones):
     # Se buscan archivos en el directorio de entrada que coincidan con los patrones dados
-    encontrados = []
-    if DIR_INPUT.exists():
-        for patron in patrones:
-            encontrados.extend(list(DIR_INPUT.glob(patron)))
-    return encontrados
+    nombres = listar_input()
+    return [DIR_INPUT / nombre for patron in patrones for nombre in fnmatch.filter(nombres, patron)]
 
 def esperar_resultado(sesion, job_id):
     # Se consulta el estado del trabajo periodicamente hasta que finalice
     print(f"Esperando resultado del trabajo {job_id}...")
+    intervalo = INTERVALO_POLLING_INICIAL
+    status_anterior = None
     while True:
         try:
-            response = sesion.get(f"{API_URL}/estado/{job_id}", timeout=30, verify=False)
+            response = sesion.get(f"{API_URL}/estado/{job_id}", timeout=30)
             if response.status_code == 200:
                 estado = response.json()
                 status = estado.get("status")
@@ -96,286 +213,286 @@ def esperar_resultado(sesion, job_id):
                     print(f"Error en el servidor: {estado.get('error')}")
                     sys.exit()
                 else:
-                    print(f"Estado: {status}... esperando {INTERVALO_POLLING}s")
+                    # Se reinicia el intervalo si el trabajo reporta progreso
+                    if status != status_anterior:
+                        intervalo = INTERVALO_POLLING_INICIAL
+                        status_anterior = status
+                    print(f"Estado: {status}... esperando {intervalo:.1f}s")
             else:
                 print(f"Error consultando estado: {response.status_code}")
         except Exception as e:
             print(f"Error de conexion al consultar estado: {e}")
         
-        time.sleep(INTERVALO_POLLING)
+        time.sleep(intervalo)
+        intervalo = min(intervalo * FACTOR_POLLING, INTERVALO_POLLING_MAXIMO)
+
+def enviar_archivos(sesion, url, files_payload, timeout):
+    # Se envian los archivos como multipart, comprimiendo el cuerpo si esta habilitado
+    if not COMPRIMIR_ENVIOS:
+        return sesion.post(url, files=files_payload, timeout=timeout)
+    
+    # Se construye el cuerpo completo y se comprime con el nivel mas rapido
+    campos = [(campo, (nombre, archivo.read(), tipo)) for campo, (nombre, archivo, tipo) in files_payload]
+    cuerpo, content_type = urllib3.encode_multipart_formdata(campos)
+    return sesion.post(
+        url,
+        data=gzip.compress(cuerpo, compresslevel=1),
+        headers={'Content-Type': content_type, 'Content-Encoding': 'gzip'},
+        timeout=timeout
+    )
 
 # Flujo principal
 
-def main():
-    # Se asegura la existencia del directorio de salida
-    DIR_OUTPUT.mkdir(parents=True, exist_ok=True)
+def enviar_y_esperar(sesion, endpoint, archivos_para_enviar, contenidos_en_memoria, nombre_fase):
+    # Se envian los archivos a la API y se espera el resultado del trabajo mediante polling
+    try:
+        # Se registran los archivos en la pila para cerrarlos aunque falle una apertura o el envio
+        with ExitStack() as pila_archivos:
+            files_payload = []
+            for nombre_archivo, _ in archivos_para_enviar:
+                # Se preparan los archivos para el envio
+                archivo = pila_archivos.enter_context(abrir_archivo_envio(nombre_archivo, contenidos_en_memoria))
+                files_payload.append(('files', (nombre_archivo, archivo, 'application/json')))
+            
+            # Se envia y se obtiene el job_id inmediatamente
+            response = enviar_archivos(sesion, f"{API_URL}{endpoint}", files_payload, timeout=60)
+    except Exception as e:
+        print(f"Error critico {nombre_fase}: {e}")
+        sys.exit()
+
+    if response.status_code != 200:
+        print(f"Error {nombre_fase}: {response.text}")
+        sys.exit()
     
-    # Se crea la sesion HTTP robusta para todas las peticiones
-    sesion = crear_sesion_robusta()
+    # Se obtiene el job_id y se espera el resultado mediante polling
+    job_info = response.json()
+    job_id = job_info.get("job_id")
+    print(f"Trabajo iniciado con ID: {job_id}")
     
-    # Se inicializan las variables de estado para el seguimiento de archivos
-    archivos_actuales_ingresos_egresos = [] 
-    archivo_actual_datos = None 
+    # Se espera el resultado consultando periodicamente
+    return esperar_resultado(sesion, job_id)
 
-    # ---------------------------------------------------------
-    # FASE 1: EXTRACCION
-    # ---------------------------------------------------------
-    if FASE_INICIAL == 1:
-        print("\nINICIO FASE 1: EXTRACCION DE DATOS")
+def ejecutar_fase1(sesion, pool_escritura, escrituras_pendientes):
+    # Se extraen los datos del PDF y se devuelven los archivos de transacciones y el de datos
+    print("\nINICIO FASE 1: EXTRACCION DE DATOS")
+    
+    archivos_ingresos_egresos = []
+    archivo_datos = None
+    
+    # Se buscan archivos PDF en el directorio de entrada
+    archivos_pdf = buscar_archivos_input(["*.pdf"])
+    if not archivos_pdf:
+        print(f"Error: No hay PDF en {DIR_INPUT}")
+        sys.exit()
         
-        # Se buscan archivos PDF en el directorio de entrada
-        archivos_pdf = buscar_archivos_input(["*.pdf"])
-        if not archivos_pdf:
-            print(f"Error: No hay PDF en {DIR_INPUT}")
-            sys.exit()
-            
-        archivo_pdf = archivos_pdf[0]
-        print(f"Procesando: {archivo_pdf.name}")
+    archivo_pdf = archivos_pdf[0]
+    print(f"Procesando: {archivo_pdf.name}")
 
-        confirmar_continuacion("Iniciar Fase 1 con este archivo?")
+    confirmar_continuacion("Iniciar Fase 1 con este archivo?")
 
-        try:
-            # Se envia el archivo PDF a la API para su extraccion
-            with open(archivo_pdf, 'rb') as f:
-                files = {'file': (archivo_pdf.name, f, 'application/pdf')}
-                response = sesion.post(f"{API_URL}/fase1/extraer", files=files, timeout=600, verify=False)
+    try:
+        # Se envia el archivo PDF a la API para su extraccion
+        with open(archivo_pdf, 'rb') as f:
+            files = {'file': (archivo_pdf.name, f, 'application/pdf')}
+            response = sesion.post(f"{API_URL}/fase1/extraer", files=files, timeout=600)
+        
+        if response.status_code != 200:
+            print(f"Error Fase 1: {response.text}")
+            sys.exit()
             
-            if response.status_code != 200:
-                print(f"Error Fase 1: {response.text}")
-                sys.exit()
-                
-            datos_fase1 = response.json()
+        datos_fase1 = response.json()
+        
+        # Se guardan los resultados en segundo plano mientras se prepara la siguiente fase
+        escrituras_pendientes.extend(
+            pool_escritura.submit(guardar_json_output, info['filename'], info['data'])
+            for info in datos_fase1.values()
+        )
+        
+        # Se clasifican los archivos para su uso en la siguiente fase
+        clasificados = [(etiqueta_archivo(key), info) for key, info in datos_fase1.items()]
+        for etiqueta, info in clasificados:
+            if etiqueta in ("INGRESOS", "EGRESOS"):
+                archivos_ingresos_egresos.append((info['filename'], info['data']))
+            elif etiqueta == "DATOS":
+                archivo_datos = (info['filename'], info['data'])
             
-            # Se guardan los resultados obtenidos en el directorio de salida
-            for key, info in datos_fase1.items():
-                guardar_json_output(info['filename'], info['data'])
-                
-                # Se clasifican los archivos para su uso en la siguiente fase
-                if "INGRESOS" in key or "EGRESOS" in key:
-                    archivos_actuales_ingresos_egresos.append((info['filename'], info['data']))
-                elif "DATOS" in key:
-                    archivo_actual_datos = (info['filename'], info['data'])
-                
-        except Exception as e:
-            print(f"Error conexion: {e}")
+    except Exception as e:
+        print(f"Error conexion: {e}")
+        sys.exit()
+    
+    return archivos_ingresos_egresos, archivo_datos
+
+def ejecutar_fase2(sesion, archivos_ingresos_egresos, archivo_datos, contenidos_en_memoria, pool_escritura, escrituras_pendientes):
+    # Se categorizan las transacciones y se devuelven los archivos con giros y el de datos
+    print("\nPREPARANDO FASE 2...")
+    
+    archivos_para_enviar_fase2 = [] 
+
+    # Se verifica si se inicia directamente en Fase 2 para cargar archivos especificos
+    if FASE_INICIAL == 2:
+        print("Cargando archivos _MODIFICADO desde INPUT...")
+        # Se buscan especificamente los archivos con sufijo _MODIFICADO
+        rutas = buscar_archivos_input(["*_INGRESOS_MODIFICADO.json", "*_EGRESOS_MODIFICADO.json"])
+        rutas_datos = buscar_archivos_input(["*_DATOS_MODIFICADO.json"])
+        
+        if not rutas:
+            print("Error: No se encontraron archivos *_MODIFICADO.json en input para Fase 2")
             sys.exit()
 
+        # Se cargan en paralelo los archivos de transacciones y el de datos si existe
+        cargados = cargar_jsons_input(rutas + rutas_datos[:1], contenidos_en_memoria)
+        
+        # Se agregan a la lista de envio sin guardar copia en output
+        archivos_para_enviar_fase2.extend(cargados[:len(rutas)])
+        if rutas_datos:
+            archivo_datos = cargados[-1]
+
+    else:
+        # Se ejecuta la logica de simulacion si se viene de la Fase 1
+        # Se generan versiones modificadas de los archivos originales
+        for nombre, datos in archivos_ingresos_egresos:
+            nombre_modificado = agregar_sufijo(nombre, SUFIJO_MODIFICADO)
+            escrituras_pendientes.append(preparar_envio(nombre_modificado, datos, contenidos_en_memoria, pool_escritura))
+            archivos_para_enviar_fase2.append((nombre_modificado, datos))
+
+        if archivo_datos:
+            nombre_datos, datos_datos = archivo_datos
+            nombre_datos_mod = agregar_sufijo(nombre_datos, SUFIJO_MODIFICADO)
+            escrituras_pendientes.append(preparar_envio(nombre_datos_mod, datos_datos, contenidos_en_memoria, pool_escritura))
+            archivo_datos = (nombre_datos_mod, datos_datos)
+
     # ---------------------------------------------------------
-    # PREPARACION FASE 2
+    # FASE 2: CATEGORIZACION
     # ---------------------------------------------------------
-    if FASE_INICIAL <= 2:
-        print("\nPREPARANDO FASE 2...")
+    print("\nINICIO FASE 2: CATEGORIZACION (GPU)")
+    
+    esperar_escrituras(escrituras_pendientes)
+    confirmar_continuacion("Iniciar Categorizacion en GPU?")
+    
+    # Se realiza la peticion a la API para categorizar
+    datos_fase2 = enviar_y_esperar(sesion, "/fase2/categorizar", archivos_para_enviar_fase2, contenidos_en_memoria, "Fase 2")
         
-        archivos_para_enviar_fase2 = [] 
-
-        # Se verifica si se inicia directamente en Fase 2 para cargar archivos especificos
-        if FASE_INICIAL == 2:
-            print("Cargando archivos _MODIFICADO desde INPUT...")
-            # Se buscan especificamente los archivos con sufijo _MODIFICADO
-            rutas = buscar_archivos_input(["*_INGRESOS_MODIFICADO.json", "*_EGRESOS_MODIFICADO.json"])
-            rutas_datos = buscar_archivos_input(["*_DATOS_MODIFICADO.json"])
-            
-            if not rutas:
-                print("Error: No se encontraron archivos *_MODIFICADO.json en input para Fase 2")
-                sys.exit()
-
-            # Se cargan los archivos de transacciones y se preparan para el envio directo
-            for r in rutas:
-                with open(r, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-                    # Se agrega a la lista de envio sin guardar copia en output
-                    archivos_para_enviar_fase2.append((r.name, data))
-            
-            # Se carga el archivo de datos si existe
-            if rutas_datos:
-                with open(rutas_datos[0], 'r', encoding='utf-8') as f:
-                    data_datos = json.load(f)
-                    archivo_actual_datos = (rutas_datos[0].name, data_datos)
+    print("\nResultados Fase 2 recibidos.")
+    
+    archivos_con_giros = []
+    # Se procesan los resultados de la categorizacion
+    for nombre_orig_modificado, contenido in datos_fase2.items():
+        nombre_con_giros = agregar_sufijo(nombre_orig_modificado, SUFIJO_CON_GIROS)
+        archivos_con_giros.append((nombre_con_giros, contenido))
+    
+    # Se guardan los resultados de la categorizacion en segundo plano mientras se prepara la Fase 3
+    escrituras_pendientes.extend(
+        pool_escritura.submit(guardar_json_output, nombre, contenido)
+        for nombre, contenido in archivos_con_giros
+    )
+    
+    return archivos_con_giros, archivo_datos
 
-        else:
-            # Se ejecuta la logica de simulacion si se viene de la Fase 1
-            # Se generan versiones modificadas de los archivos originales
-            nuevos_ingresos_egresos = []
-            for nombre, datos in archivos_actuales_ingresos_egresos:
-                nombre_modificado = nombre.replace(".json", "_MODIFICADO.json")
-                guardar_json_output(nombre_modificado, datos)
-                archivos_para_enviar_fase2.append((nombre_modificado, datos))
-                nuevos_ingresos_egresos.append((nombre_modificado, datos))
-            
-            archivos_actuales_ingresos_egresos = nuevos_ingresos_egresos
-
-            if archivo_actual_datos:
-                nombre_datos, datos_datos = archivo_actual_datos
-                nombre_datos_mod = nombre_datos.replace(".json", "_MODIFICADO.json")
-                guardar_json_output(nombre_datos_mod, datos_datos)
-                archivo_actual_datos = (nombre_datos_mod, datos_datos)
-
-        # ---------------------------------------------------------
-        # FASE 2: CATEGORIZACION
-        # ---------------------------------------------------------
-        print("\nINICIO FASE 2: CATEGORIZACION (GPU)")
+def ejecutar_fase3(sesion, archivos_ingresos_egresos, archivo_datos, contenidos_en_memoria, pool_escritura, escrituras_pendientes):
+    # Se genera el perfil empresarial y se guarda en el directorio de salida
+    print("\nPREPARANDO FASE 3...")
+    
+    archivos_para_enviar_fase3 = []
+
+    # Se verifica si se inicia directamente en Fase 3 para cargar archivos especificos
+    if FASE_INICIAL == 3:
+        print("Cargando archivos complejos desde INPUT para Fase 3...")
+        # Se buscan archivos con la nomenclatura especifica solicitada
+        rutas_ingresos = buscar_archivos_input(["*_INGRESOS_MODIFICADO_CON_GIROS_MODIFICADO.json"])
+        rutas_egresos = buscar_archivos_input(["*_EGRESOS_MODIFICADO_CON_GIROS_MODIFICADO.json"])
+        rutas_datos = buscar_archivos_input(["*_DATOS_MODIFICADO_MODIFICADO.json"]) 
         
-        confirmar_continuacion("Iniciar Categorizacion en GPU?")
+        rutas_todas = rutas_ingresos + rutas_egresos
         
-        files_payload = []
-        for nombre_archivo, _ in archivos_para_enviar_fase2:
-            # Se determina la ruta origen (Input o Output) para evitar duplicados
-            ruta = DIR_OUTPUT / nombre_archivo
-            if not ruta.exists():
-                ruta = DIR_INPUT / nombre_archivo
-            
-            # Se preparan los archivos para el envio
-            files_payload.append(('files', (nombre_archivo, open(ruta, 'rb'), 'application/json')))
-
-        try:
-            # Se realiza la peticion a la API para categorizar
-            # Se envia y se obtiene el job_id inmediatamente
-            response = sesion.post(
-                f"{API_URL}/fase2/categorizar",
-                files=files_payload,
-                timeout=60,
-                verify=False
-            )
-        except Exception as e:
-            print(f"Error critico Fase 2: {e}")
+        if not rutas_todas or not rutas_datos:
+            print("Error: Faltan archivos con nomenclatura _MODIFICADO_CON_GIROS_MODIFICADO o _DATOS_MODIFICADO_MODIFICADO en input.")
             sys.exit()
-        finally:
-            # Se cierran los manejadores de archivos abiertos
-            for _, file_tuple in files_payload:
-                file_tuple[1].close()
 
-        if response.status_code != 200:
-            print(f"Error Fase 2: {response.text}")
-            sys.exit()
-        
-        # Se obtiene el job_id y se espera el resultado mediante polling
-        job_info = response.json()
-        job_id = job_info.get("job_id")
-        print(f"Trabajo iniciado con ID: {job_id}")
-        
-        # Se espera el resultado consultando periodicamente
-        datos_fase2 = esperar_resultado(sesion, job_id)
-            
-        print("\nResultados Fase 2 recibidos.")
+        # Se cargan en paralelo los archivos de transacciones tal cual estan y el de datos
+        # Se agregan a la lista de envio sin guardar copia en output (el de datos va al final)
+        archivos_para_enviar_fase3 = cargar_jsons_input(rutas_todas + rutas_datos[:1], contenidos_en_memoria)
+        archivo_datos = archivos_para_enviar_fase3[-1]
+
+    else:
+        # Se ejecuta la logica de simulacion si se viene de fases previas (1 o 2)
+        # Se generan versiones modificadas nuevamente sobre los archivos con giros
         
-        archivos_actuales_ingresos_egresos = []
-        # Se procesan y guardan los resultados de la categorizacion
-        for nombre_orig_modificado, contenido in datos_fase2.items():
-            nombre_con_giros = nombre_orig_modificado.replace(".json", "_CON_GIROS.json")
-            guardar_json_output(nombre_con_giros, contenido)
-            archivos_actuales_ingresos_egresos.append((nombre_con_giros, contenido))
+        # Se procesan las transacciones
+        for nombre, datos in archivos_ingresos_egresos:
+            nombre_re_modificado = agregar_sufijo(nombre, SUFIJO_MODIFICADO)
+            escrituras_pendientes.append(preparar_envio(nombre_re_modificado, datos, contenidos_en_memoria, pool_escritura))
+            archivos_para_enviar_fase3.append((nombre_re_modificado, datos))
+
+        # Se procesan los datos generales
+        if archivo_datos:
+            nombre_datos, datos_datos = archivo_datos
+            nombre_datos_re_mod = agregar_sufijo(nombre_datos, SUFIJO_MODIFICADO)
+            escrituras_pendientes.append(preparar_envio(nombre_datos_re_mod, datos_datos, contenidos_en_memoria, pool_escritura))
+            archivos_para_enviar_fase3.append((nombre_datos_re_mod, datos_datos))
+            archivo_datos = (nombre_datos_re_mod, datos_datos)
+        else:
+            print("Error: Falta archivo DATOS para Fase 3")
+            sys.exit()
 
     # ---------------------------------------------------------
-    # PREPARACION FASE 3
+    # FASE 3: PERFILADO
     # ---------------------------------------------------------
-    if FASE_INICIAL <= 3:
-        print("\nPREPARANDO FASE 3...")
+    print("\nINICIO FASE 3: PERFILADO EMPRESARIAL")
+    
+    esperar_escrituras(escrituras_pendientes)
+    confirmar_continuacion("Generar Perfil Empresarial?")
+    
+    # Se envia la solicitud de perfilado a la API
+    perfil_final = enviar_y_esperar(sesion, "/fase3/perfilar", archivos_para_enviar_fase3, contenidos_en_memoria, "Fase 3")
         
-        archivos_para_enviar_fase3 = []
-
-        # Se verifica si se inicia directamente en Fase 3 para cargar archivos especificos
-        if FASE_INICIAL == 3:
-             print("Cargando archivos complejos desde INPUT para Fase 3...")
-             # Se buscan archivos con la nomenclatura especifica solicitada
-             rutas_ingresos = buscar_archivos_input(["*_INGRESOS_MODIFICADO_CON_GIROS_MODIFICADO.json"])
-             rutas_egresos = buscar_archivos_input(["*_EGRESOS_MODIFICADO_CON_GIROS_MODIFICADO.json"])
-             rutas_datos = buscar_archivos_input(["*_DATOS_MODIFICADO_MODIFICADO.json"]) 
-             
-             rutas_todas = rutas_ingresos + rutas_egresos
-             
-             if not rutas_todas or not rutas_datos:
-                 print("Error: Faltan archivos con nomenclatura _MODIFICADO_CON_GIROS_MODIFICADO o _DATOS_MODIFICADO_MODIFICADO en input.")
-                 sys.exit()
-
-             # Se cargan los archivos de transacciones tal cual estan
-             for r in rutas_todas:
-                 with open(r, 'r', encoding='utf-8') as f:
-                     data = json.load(f)
-                     # Se agrega a la lista de envio sin guardar copia en output
-                     archivos_para_enviar_fase3.append((r.name, data))
-             
-             if rutas_datos:
-                 with open(rutas_datos[0], 'r', encoding='utf-8') as f:
-                     data = json.load(f)
-                     archivo_actual_datos = (rutas_datos[0].name, data)
-                     # Tambien se agrega el archivo de datos a la lista de envio
-                     archivos_para_enviar_fase3.append((rutas_datos[0].name, data))
+    print("\nPerfilado completado.")
+    
+    # Se construye el nombre final del perfil y se guarda
+    nombre_base_datos = archivo_datos[0] 
+    nombre_final_perfil = agregar_sufijo(nombre_base_datos, SUFIJO_PERFIL)
+    
+    guardar_json_output(nombre_final_perfil, perfil_final)
+    print("\nPROCESO COMPLETADO EXITOSAMENTE")
 
-        else:
-            # Se ejecuta la logica de simulacion si se viene de fases previas (1 o 2)
-            # Se generan versiones modificadas nuevamente sobre los archivos con giros
-            
-            # Se procesan las transacciones
-            for nombre, datos in archivos_actuales_ingresos_egresos:
-                nombre_re_modificado = nombre.replace(".json", "_MODIFICADO.json")
-                guardar_json_output(nombre_re_modificado, datos)
-                archivos_para_enviar_fase3.append((nombre_re_modificado, datos))
-
-            # Se procesan los datos generales
-            if archivo_actual_datos:
-                nombre_datos, datos_datos = archivo_actual_datos
-                nombre_datos_re_mod = nombre_datos.replace(".json", "_MODIFICADO.json")
-                guardar_json_output(nombre_datos_re_mod, datos_datos)
-                archivos_para_enviar_fase3.append((nombre_datos_re_mod, datos_datos))
-                archivo_actual_datos = (nombre_datos_re_mod, datos_datos)
-            else:
-                print("Error: Falta archivo DATOS para Fase 3")
-                sys.exit()
+def main():
+    # Se asegura la existencia del directorio de salida
+    DIR_OUTPUT.mkdir(parents=True, exist_ok=True)
+    
+    # Se crea la sesion HTTP robusta para todas las peticiones
+    sesion = crear_sesion_robusta()
+    
+    # Se crea el pool de hilos para las escrituras independientes en OUTPUT
+    pool_escritura = ThreadPoolExecutor(max_workers=MAX_HILOS_ESCRITURA)
+    
+    # Se inicializan las variables de estado para el seguimiento de archivos
+    archivos_actuales_ingresos_egresos = [] 
+    archivo_actual_datos = None 
+    
+    # Se conservan los bytes ya serializados para enviarlos sin releer el disco
+    contenidos_en_memoria = {}
+    
+    # Se registran las escrituras en segundo plano para verificar que terminen sin errores
+    escrituras_pendientes = []
 
-        # ---------------------------------------------------------
-        # FASE 3: PERFILADO
-        # ---------------------------------------------------------
-        print("\nINICIO FASE 3: PERFILADO EMPRESARIAL")
-        
-        confirmar_continuacion("Generar Perfil Empresarial?")
-        
-        files_payload = []
-        # Se preparan todos los archivos requeridos para el perfilado
-        for nombre_archivo, _ in archivos_para_enviar_fase3:
-            # Se determina la ruta origen (Input o Output) para evitar duplicados
-            ruta = DIR_OUTPUT / nombre_archivo
-            if not ruta.exists():
-                ruta = DIR_INPUT / nombre_archivo
-                
-            files_payload.append(('files', (nombre_archivo, open(ruta, 'rb'), 'application/json')))
+    # Se ejecutan las fases a partir de la fase inicial configurada
+    if FASE_INICIAL == 1:
+        archivos_actuales_ingresos_egresos, archivo_actual_datos = ejecutar_fase1(sesion, pool_escritura, escrituras_pendientes)
 
-        try:
-            # Se envia la solicitud de perfilado a la API
-            # Se envia y se obtiene el job_id inmediatamente
-            response = sesion.post(
-                f"{API_URL}/fase3/perfilar",
-                files=files_payload,
-                timeout=60,
-                verify=False
-            )
-        except Exception as e:
-            print(f"Error critico Fase 3: {e}")
-            sys.exit()
-        finally:
-            # Se cierran los archivos
-            for _, file_tuple in files_payload:
-                file_tuple[1].close()
+    if FASE_INICIAL <= 2:
+        archivos_actuales_ingresos_egresos, archivo_actual_datos = ejecutar_fase2(
+            sesion, archivos_actuales_ingresos_egresos, archivo_actual_datos,
+            contenidos_en_memoria, pool_escritura, escrituras_pendientes
+        )
 
-        if response.status_code != 200:
-            print(f"Error Fase 3: {response.text}")
-            sys.exit()
-        
-        # Se obtiene el job_id y se espera el resultado mediante polling
-        job_info = response.json()
-        job_id = job_info.get("job_id")
-        print(f"Trabajo iniciado con ID: {job_id}")
-        
-        # Se espera el resultado consultando periodicamente
-        perfil_final = esperar_resultado(sesion, job_id)
-            
-        print("\nPerfilado completado.")
-        
-        # Se construye el nombre final del perfil y se guarda
-        nombre_base_datos = archivo_actual_datos[0] 
-        nombre_final_perfil = nombre_base_datos.replace(".json", "_PERFIL.json")
-        
-        guardar_json_output(nombre_final_perfil, perfil_final)
-        print("\nPROCESO COMPLETADO EXITOSAMENTE")
+    if FASE_INICIAL <= 3:
+        ejecutar_fase3(
+            sesion, archivos_actuales_ingresos_egresos, archivo_actual_datos,
+            contenidos_en_memoria, pool_escritura, escrituras_pendientes
+        )
+    
+    # Se espera a que terminen las escrituras pendientes y se propagan sus errores
+    esperar_escrituras(escrituras_pendientes)
+    pool_escritura.shutdown(wait=True)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
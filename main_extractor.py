@@ -2,123 +2,385 @@
 import sys
 import json
 import fitz
+import cv2
+import numpy as np
 from paddleocr import PaddleOCR
 from decimal import Decimal
 import os
 import re
+import argparse
+import calendar
+import functools
+import gc
+import hashlib
+import queue
+import threading
+import traceback
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from datetime import datetime
+
+# Se utiliza orjson si esta disponible (serializacion mas rapida), con respaldo en json
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 # Se importan los módulos locales
 from parsers import banamex_empresa_parser, bbva_parser, inbursa_parser
 from utils.image_preprocessing import prepare_image_for_ocr
 from utils import validators
 
-# Se suprimen las advertencias de PaddleOCR
+import contextlib
 import logging
-logging.disable(logging.WARNING)
 import warnings
-warnings.filterwarnings('ignore')
+
+@contextlib.contextmanager
+def silenciar_paddle():
+    """
+    Se suprimen los logs y advertencias de PaddleOCR solo mientras dura el bloque.
+    """
+    nivel_anterior = logging.root.manager.disable
+    logging.disable(logging.WARNING)
+    try:
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            yield
+    finally:
+        logging.disable(nivel_anterior)
 
 # Se definen las rutas relativas al script
 SCRIPT_DIR = Path(__file__).parent.resolve()
 INPUT_DIR = SCRIPT_DIR / "input"
 OUTPUT_DIR = SCRIPT_DIR / "output"
+CACHE_DIR = SCRIPT_DIR / ".cache"
+
+# Se incrementa al cambiar la extraccion o el preprocesamiento para invalidar el texto en cache
+VERSION_CACHE_TEXTO = 3
+
+# Se precompilan los patrones usados al generar los nombres de archivo
+# Un solo patron para los dos formatos de periodo; la alternativa que coincide queda en lastgroup:
+# - formateado: el periodo completo ya viene listo (ej: 01ABR2024_30ABR2024)
+# - del_al: "DEL dd/mm/aaaa AL dd/mm/aaaa" en cualquier parte del texto (sin distinguir mayusculas)
+PATRON_PERIODO = re.compile(
+    r"(?P<formateado>\d{2}[A-Z]{3}\d{4}_\d{2}[A-Z]{3}\d{4})$"
+    r"|.*?(?P<del_al>(?i:DEL)\s+(?P<inicio>\d{2}/\d{2}/\d{4})\s+(?i:AL)\s+(?P<fin>\d{2}/\d{2}/\d{4}))",
+    re.DOTALL
+)
+
+# Se limpian los nombres de archivo con str.translate (una sola pasada) en lugar de regex
+CARACTERES_NOMBRE_ARCHIVO = frozenset("ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789_")
+
+class _TablaNombreArchivo(dict):
+    """
+    Tabla para str.translate: conserva A-Z, 0-9, '_' y espacios; elimina el resto.
+    Cada carácter nuevo se resuelve una vez y queda guardado en la tabla.
+    """
+    def __missing__(self, codigo):
+        caracter = chr(codigo)
+        valor = codigo if caracter in CARACTERES_NOMBRE_ARCHIVO or caracter.isspace() else None
+        self[codigo] = valor
+        return valor
+
+TABLA_NOMBRE_ARCHIVO = _TablaNombreArchivo()
+
+# Se definen las palabras clave para detectar el banco: (palabra, banco, puntos, por_aparicion, requiere)
+# - por_aparicion: los puntos se suman por cada aparicion; si no, una sola vez si aparece
+# - requiere: otra palabra que tambien debe aparecer en el documento para sumar
+PALABRAS_CLAVE_BANCO = (
+    # NIVEL 1: Identificadores fiscales (RFC). 50 puntos por aparicion
+    ("BNM840515VB1", "banamex_empresa", 50, True, None),
+    ("BBA830831LJ2", "bbva_empresa", 50, True, None),
+    ("BII931004P61", "inbursa_empresa", 50, True, None),
+    # NIVEL 2: Productos exclusivos. Puntos fijos si aparecen
+    ("INVERSION EMPRESARIAL", "banamex_empresa", 20, False, None),
+    ("CUENTA DE CHEQUES MONEDA NACIONAL", "banamex_empresa", 20, False, None),
+    ("CITIBANAMEX", "banamex_empresa", 15, False, None),
+    ("MAESTRA PYME", "bbva_empresa", 20, False, None),
+    ("VERSATIL NEGOCIOS", "bbva_empresa", 20, False, None),
+    ("CASH WINDOWS", "bbva_empresa", 15, False, None),
+    ("LIBRETON", "bbva_empresa", 15, False, None),
+    ("INBURSACT", "inbursa_empresa", 30, False, None),
+    ("CT EMPRESARIAL", "inbursa_empresa", 20, False, "INBURSA"),
+    ("BIN-", "inbursa_empresa", 15, False, None),  # Folio típico de Inbursa
+    # NIVEL 3: Menciones de marca (desempate). 1 punto por aparicion
+    ("BANAMEX", "banamex_empresa", 1, True, None),
+    ("BANCO NACIONAL DE MEXICO", "banamex_empresa", 1, True, None),
+    ("BBVA", "bbva_empresa", 1, True, None),
+    ("BANCOMER", "bbva_empresa", 1, True, None),
+    ("INBURSA", "inbursa_empresa", 1, True, None),
+    ("GRUPO FINANCIERO INBURSA", "inbursa_empresa", 1, True, None),
+)
+
+# Se compila un solo patron con todas las palabras clave (las mas largas primero)
+# La busqueda anticipada reporta la palabra mas larga que inicia en cada posicion
+# Se ignoran mayusculas/minusculas en el patron para no copiar cada pagina con upper()
+_PALABRAS_ORDENADAS = sorted({palabra for palabra, *_ in PALABRAS_CLAVE_BANCO}, key=len, reverse=True)
+PATRON_PALABRAS_CLAVE_BANCO = re.compile(
+    "(?=(" + "|".join(re.escape(palabra) for palabra in _PALABRAS_ORDENADAS) + "))", re.IGNORECASE
+)
+
+# Se acreditan tambien las palabras que son prefijo de la encontrada (ej: INBURSACT contiene INBURSA)
+PREFIJOS_PALABRA_CLAVE = {
+    palabra: [otra for otra in _PALABRAS_ORDENADAS if palabra.startswith(otra)]
+    for palabra in _PALABRAS_ORDENADAS
+}
+
+# Se detiene la deteccion cuando el lider supera este puntaje y aventaja al segundo por lo mismo (un RFC)
+MARGEN_DETECCION_BANCO = 50
+
+# Se definen las abreviaturas de mes usadas en los nombres de archivo (indice = numero de mes)
+MESES_ABREVIADOS = ('', 'JAN', 'FEB', 'MAR', 'APR', 'MAY', 'JUN', 'JUL', 'AUG', 'SEP', 'OCT', 'NOV', 'DEC')
+
+# Se considera suficiente el texto nativo si cada pagina tiene texto y el promedio supera este minimo
+MIN_CARACTERES_PAGINA = 50
+MIN_CARACTERES_PROMEDIO = 500
+
+# Se definen los tamanos de lote del OCR: en CPU se procesa de uno en uno para reducir memoria
+# En GPU cada llamada a ocr() reconoce las lineas de una sola pagina; 16 se llena con una pagina
+# normal de estado de cuenta sin reservar espacio de sobra para lotes que no se completan
+TAMANO_LOTE_OCR_CPU = 1
+TAMANO_LOTE_OCR_GPU = 16
+
+# Se limita el numero de paginas preprocesadas en espera del OCR para acotar la memoria
+TAMANO_COLA_OCR = 8
+
+def _calentar_motor_ocr(ocr_engine, use_gpu):
+    """
+    Se ejecuta una inferencia inicial sobre una imagen con texto para que
+    la carga de modelos y la reserva de memoria no recaigan en el primer PDF.
+    """
+    imagen = np.full((64, 480, 3), 255, dtype=np.uint8)
+    cv2.putText(imagen, "SALDO ANTERIOR 1,234.56", (10, 44), cv2.FONT_HERSHEY_SIMPLEX, 1.0, (0, 0, 0), 2)
+    try:
+        # En GPU la segunda pasada deja listos los algoritmos de cuDNN elegidos en la primera
+        for _ in range(2 if use_gpu else 1):
+            ocr_engine.ocr(imagen)
+    except Exception as e:
+        print(f"  > Advertencia: no se pudo calentar el motor OCR: {e}")
+
+@functools.lru_cache(maxsize=1)
+def _obtener_motor_ocr(use_gpu, rec_batch_num, cls_batch_num, cpu_threads):
+    """
+    Se crea y calienta el motor PaddleOCR una sola vez por proceso y configuración.
+    """
+    print("Inicializando motor OCR (PaddleOCR). Esto puede tomar un momento...")
+    
+    # Inicializar PaddleOCR SIN el parámetro use_gpu
+    with silenciar_paddle():
+        ocr_engine = PaddleOCR(
+            lang='es',
+            # Las páginas ya se enderezan en el preprocesamiento (deskew), no hace falta clasificar el ángulo
+            use_angle_cls=False,
+            det_db_thresh=0.2,
+            det_db_box_thresh=0.3,
+            rec_batch_num=rec_batch_num,
+            cls_batch_num=cls_batch_num,
+            det_limit_side_len=3000,
+            det_limit_type='max',
+            enable_mkldnn=not use_gpu,
+            cpu_threads=cpu_threads
+        )
+    
+        _calentar_motor_ocr(ocr_engine, use_gpu)
+    
+    print(f"Motor OCR listo (lote de reconocimiento: {rec_batch_num}, lote de clasificacion: {cls_batch_num}).")
+    return ocr_engine
+
 
 class BankStatementExtractor:
     """
     Se implementa el extractor principal del sistema.
     """
     
-    MONTH_MAP = {
-        'enero': 'JAN', 'feb': 'FEB', 'mar': 'MAR', 'abr': 'APR', 'may': 'MAY', 'jun': 'JUN',
-        'jul': 'JUL', 'ago': 'AUG', 'sep': 'SEP', 'oct': 'OCT', 'nov': 'NOV', 'dic': 'DEC',
-        'ENERO': 'JAN', 'FEB': 'FEB', 'MAR': 'MAR', 'ABR': 'APR', 'MAY': 'MAY', 'JUN': 'JUN',
-        'JUL': 'JUL', 'AGO': 'AUG', 'SEP': 'SEP', 'OCT': 'OCT', 'NOV': 'NOV', 'DIC': 'DEC',
-        'ENE': 'JAN',
-    }
-    
-    def __init__(self, use_gpu=False):
+    def __init__(self, use_gpu=False, rec_batch_num=None, force_ocr=False, usar_cache=True, cpu_threads=None):
         """
         Se inicializa el extractor.
+        rec_batch_num=None usa 1 en CPU (menor pico de memoria) y un lote mayor en GPU.
+        force_ocr=True ejecuta el OCR aunque el texto nativo parezca suficiente.
+        usar_cache=True reutiliza el texto extraído de PDFs ya procesados (por huella de contenido).
+        cpu_threads=None usa todos los núcleos para la inferencia en CPU.
         """
         self.use_gpu = use_gpu
+        self.force_ocr = force_ocr
+        self.usar_cache = usar_cache
+        
+        tamano_lote = TAMANO_LOTE_OCR_GPU if self.use_gpu else TAMANO_LOTE_OCR_CPU
+        if rec_batch_num is None:
+            rec_batch_num = tamano_lote
+        if cpu_threads is None:
+            cpu_threads = os.cpu_count() or 1
         
         # Forzar uso de CPU si use_gpu=False
         if not self.use_gpu:
-            import os
             os.environ['CUDA_VISIBLE_DEVICES'] = '-1'
         
         # Suprimir logs de PaddleOCR
         import logging
         logging.getLogger('ppocr').setLevel(logging.ERROR)
         
-        print("Inicializando motor OCR (PaddleOCR). Esto puede tomar un momento...")
-        
-        # Inicializar PaddleOCR SIN el parámetro use_gpu
-        self.ocr_engine = PaddleOCR(
-            lang='es',
-            use_angle_cls=True,
-            det_db_thresh=0.2,
-            det_db_box_thresh=0.3,
-            rec_batch_num=16,
-            det_limit_side_len=3000,
-            det_limit_type='max'
-        )
-        
-        print("Motor OCR listo.")
+        # El motor OCR se crea al primer uso: los PDFs digitales no llegan a necesitarlo
+        self._configuracion_ocr = (self.use_gpu, rec_batch_num, tamano_lote, cpu_threads)
         
+        # Se asocia cada banco con la funcion que ejecuta su parser
         self.parsers = {
-            "banamex_empresa": banamex_empresa_parser,
-            "bbva_empresa": bbva_parser,
-            "inbursa_empresa": inbursa_parser
+            "banamex_empresa": self._parsear_banamex,
+            "bbva_empresa": self._parsear_bbva,
+            "inbursa_empresa": self._parsear_inbursa
         }
 
-    def _extract_text_native(self, pdf_path):
+    @property
+    def ocr_engine(self):
+        """
+        Se obtiene el motor OCR, creándolo y calentándolo la primera vez que se usa.
+        Se reutiliza el motor si ya se creó uno con la misma configuración en este proceso.
+        """
+        return _obtener_motor_ocr(*self._configuracion_ocr)
+
+    def _huella_pdf(self, pdf_bytes):
+        """
+        Se calcula la huella del contenido del PDF para identificarlo en la cache.
+        """
+        return hashlib.blake2b(pdf_bytes, digest_size=16).hexdigest()
+
+    def _cargar_cache_texto(self, huella):
+        """
+        Se recupera el texto extraído previamente para este PDF, o None si no existe.
+        """
+        if not self.usar_cache:
+            return None
+        ruta = CACHE_DIR / f"{huella}.json"
+        try:
+            with open(ruta, 'rb') as f:
+                contenido = f.read()
+            datos = orjson.loads(contenido) if orjson is not None else json.loads(contenido)
+        except (OSError, ValueError):
+            return None
+        # Un archivo con otra forma (no dict, sin claves o con tipos distintos) se trata como ausente
+        if not isinstance(datos, dict) or datos.get("version") != VERSION_CACHE_TEXTO:
+            return None
+        if not self._paginas_validas(datos.get("nativas")):
+            return None
+        if "ocr" not in datos or (datos["ocr"] is not None and not self._paginas_validas(datos["ocr"])):
+            return None
+        return datos
+
+    def _paginas_validas(self, paginas):
+        """
+        Se verifica que el texto en cache sea una lista con un texto por página.
+        """
+        return isinstance(paginas, list) and all(isinstance(pagina, str) for pagina in paginas)
+
+    def _guardar_cache_texto(self, huella, paginas_nativas, paginas_ocr):
         """
-        Se extrae texto nativo pagina por pagina.
+        Se guarda el texto extraído en la cache de forma atómica.
+        """
+        if not self.usar_cache or not paginas_nativas:
+            return
+        datos = {"version": VERSION_CACHE_TEXTO, "nativas": paginas_nativas, "ocr": paginas_ocr}
+        ruta = CACHE_DIR / f"{huella}.json"
+        ruta_temporal = ruta.with_name(f"{ruta.name}.{os.getpid()}.tmp")
+        try:
+            CACHE_DIR.mkdir(parents=True, exist_ok=True)
+            contenido = orjson.dumps(datos) if orjson is not None else json.dumps(datos, ensure_ascii=False).encode('utf-8')
+            with open(ruta_temporal, 'wb') as f:
+                f.write(contenido)
+            os.replace(ruta_temporal, ruta)
+        except OSError as e:
+            print(f"  > Advertencia: no se pudo guardar la cache de texto: {e}")
+
+    def _texto_nativo_suficiente(self, paginas_texto):
+        """
+        Se determina si el texto nativo es suficiente para omitir el OCR (PDF digital, no escaneado).
+        """
+        if not paginas_texto:
+            return False
+        
+        paginas_con_texto = sum(1 for pagina in paginas_texto if len(pagina.strip()) > MIN_CARACTERES_PAGINA)
+        total_caracteres = sum(len(pagina) for pagina in paginas_texto)
+        return (paginas_con_texto == len(paginas_texto)
+                and total_caracteres > MIN_CARACTERES_PROMEDIO * len(paginas_texto))
+
+    def _extract_text_native(self, doc):
+        """
+        Se extrae texto nativo pagina por pagina del documento ya abierto.
         """
         paginas_texto = []
+        if doc is None:
+            return paginas_texto
+        
+        # Se pausa el recolector ciclico: get_text genera muchos objetos temporales sin ciclos
+        gc_activo = gc.isenabled()
+        gc.disable()
         try:
-            doc = fitz.open(pdf_path)
-            for page in doc:
-                paginas_texto.append(page.get_text("text"))
-            doc.close()
+            paginas_texto = [doc.load_page(i).get_text("text") for i in range(doc.page_count)]
         except Exception as e:
             print(f"Error en extraccion nativa: {e}")
+        finally:
+            if gc_activo:
+                gc.enable()
         return paginas_texto
 
-    def _extract_text_ocr(self, pdf_path):
+    def _extract_text_ocr(self, doc):
         """
         Se extrae texto con OCR página por página CON PREPROCESAMIENTO.
+        Un hilo productor renderiza y preprocesa las páginas mientras el hilo
+        principal ejecuta el OCR de la página anterior.
         """
         paginas_texto = []
-        try:
-            doc = fitz.open(pdf_path)
+        if doc is None:
+            return paginas_texto
+        cola_paginas = queue.Queue(maxsize=TAMANO_COLA_OCR)
+        
+        def producir_imagenes():
+            # Solo este hilo usa el documento mientras dura el OCR (PyMuPDF no es seguro entre hilos)
+            try:
+                for page_num in range(len(doc)):
+                    try:
+                        img_preprocessed = prepare_image_for_ocr(doc[page_num], enhance_tables=True)
+                        cola_paginas.put((page_num, img_preprocessed, None))
+                    except Exception as e_page:
+                        cola_paginas.put((page_num, None, e_page))
+            except Exception as e:
+                cola_paginas.put((None, None, e))
+            finally:
+                # Se marca el final de las páginas
+                cola_paginas.put(None)
+        
+        productor = threading.Thread(target=producir_imagenes, daemon=True)
+        productor.start()
+        
+        while True:
+            elemento = cola_paginas.get()
+            if elemento is None:
+                break
+            
+            page_num, img_preprocessed, error = elemento
+            if page_num is None:
+                print(f"Error en extracción OCR: {error}")
+                continue
             
-            for page_num in range(len(doc)):
-                page = doc[page_num]
+            try:
+                if error is not None:
+                    raise error
                 
-                try:
-                    img_preprocessed = prepare_image_for_ocr(page, enhance_tables=True)
+                with silenciar_paddle():
                     resultado_ocr = self.ocr_engine.ocr(img_preprocessed)
-                    
-                    texto_pagina_actual = ""
-                    if resultado_ocr and len(resultado_ocr) > 0 and resultado_ocr[0]:
-                        for linea in resultado_ocr[0]:
-                            if linea and len(linea) >= 2:
-                                texto_pagina_actual += linea[1][0] + "\n"
-                    
-                    paginas_texto.append(texto_pagina_actual)
-                    
-                except Exception as e_page:
-                    print(f"  > Error procesando página {page_num + 1} con OCR: {e_page}")
-                    paginas_texto.append("")
-            
-            doc.close()
-            
-        except Exception as e:
-            print(f"Error en extracción OCR: {e}")
+                
+                texto_pagina_actual = ""
+                if resultado_ocr and len(resultado_ocr) > 0 and resultado_ocr[0]:
+                    # Se unen las líneas en una sola operación en lugar de concatenar una por una
+                    lineas = [linea[1][0] for linea in resultado_ocr[0] if linea and len(linea) >= 2]
+                    if lineas:
+                        texto_pagina_actual = "\n".join(lineas) + "\n"
+                
+                paginas_texto.append(texto_pagina_actual)
+                
+            except Exception as e_page:
+                print(f"  > Error procesando página {page_num + 1} con OCR: {e_page}")
+                paginas_texto.append("")
+        
+        productor.join()
         
         return paginas_texto
 
@@ -130,55 +392,21 @@ class BankStatementExtractor:
         """
         if not paginas_texto:
             return "desconocido"
-            
-        # Unimos todo el texto para analizar el documento como un todo
-        texto_completo = "\n".join(paginas_texto)
-        texto_upper = texto_completo.upper()
         
-        # Inicializamos el marcador a 0 para todos
-        scores = {
-            "banamex_empresa": 0,
-            "bbva_empresa": 0,
-            "inbursa_empresa": 0
-        }
-        
-        # --- NIVEL 1: IDENTIFICADORES FISCALES (RFC) ---
-        # Es la prueba más fuerte. Si aparece, es casi seguro que es ese banco.
-        # Peso: 50 puntos por aparición.
-        scores["banamex_empresa"] += texto_upper.count("BNM840515VB1") * 50
-        scores["bbva_empresa"] += texto_upper.count("BBA830831LJ2") * 50
-        scores["inbursa_empresa"] += texto_upper.count("BII931004P61") * 50
-        
-        # --- NIVEL 2: PRODUCTOS EXCLUSIVOS ---
-        # Nombres que solo usa ese banco. Peso: 20 puntos.
-        
-        # Banamex
-        if "INVERSION EMPRESARIAL" in texto_upper: scores["banamex_empresa"] += 20
-        if "CUENTA DE CHEQUES MONEDA NACIONAL" in texto_upper: scores["banamex_empresa"] += 20
-        if "CITIBANAMEX" in texto_upper: scores["banamex_empresa"] += 15
-        
-        # BBVA
-        if "MAESTRA PYME" in texto_upper: scores["bbva_empresa"] += 20
-        if "VERSATIL NEGOCIOS" in texto_upper: scores["bbva_empresa"] += 20
-        if "CASH WINDOWS" in texto_upper: scores["bbva_empresa"] += 15
-        if "LIBRETON" in texto_upper: scores["bbva_empresa"] += 15
-        
-        # Inbursa
-        if "INBURSACT" in texto_upper: scores["inbursa_empresa"] += 30
-        if "CT EMPRESARIAL" in texto_upper and "INBURSA" in texto_upper: scores["inbursa_empresa"] += 20
-        if "BIN-" in texto_upper: scores["inbursa_empresa"] += 15  # Folio típico de Inbursa
-        
-        # --- NIVEL 3: MENCIONES DE MARCA (Desempate) ---
-        # Cuenta cuántas veces se dice el nombre del banco. 
-        # Sirve para confirmar, pero vale poco (1 punto) para no confundirse con transferencias.
-        scores["banamex_empresa"] += texto_upper.count("BANAMEX")
-        scores["banamex_empresa"] += texto_upper.count("BANCO NACIONAL DE MEXICO")
-        
-        scores["bbva_empresa"] += texto_upper.count("BBVA")
-        scores["bbva_empresa"] += texto_upper.count("BANCOMER")
-        
-        scores["inbursa_empresa"] += texto_upper.count("INBURSA")
-        scores["inbursa_empresa"] += texto_upper.count("GRUPO FINANCIERO INBURSA")
+        # Se cuentan todas las palabras clave en una sola pasada por página (sin unir el documento)
+        apariciones = dict.fromkeys(PREFIJOS_PALABRA_CLAVE, 0)
+        for pagina in paginas_texto:
+            for coincidencia in PATRON_PALABRAS_CLAVE_BANCO.finditer(pagina):
+                # Solo se pasa a mayusculas el texto encontrado, no la pagina completa
+                for palabra in PREFIJOS_PALABRA_CLAVE.get(coincidencia.group(1).upper(), ()):
+                    apariciones[palabra] += 1
+            
+            scores = self._puntuar_apariciones(apariciones)
+            
+            # Se deja de leer páginas cuando un banco ya domina (normalmente el RFC de la primera página)
+            primero, segundo = sorted(scores.values(), reverse=True)[:2]
+            if primero >= MARGEN_DETECCION_BANCO and primero - segundo >= MARGEN_DETECCION_BANCO:
+                break
 
         # --- DECISIÓN FINAL ---
         # Obtener el banco con el puntaje más alto
@@ -194,48 +422,63 @@ class BankStatementExtractor:
             return "desconocido" 
             
         return banco_ganador
-            
-        return banco_ganador
+
+    def _puntuar_apariciones(self, apariciones):
+        """
+        Se aplican los pesos de cada nivel (RFC > productos exclusivos > menciones de marca).
+        """
+        # Inicializamos el marcador a 0 para todos
+        scores = {
+            "banamex_empresa": 0,
+            "bbva_empresa": 0,
+            "inbursa_empresa": 0
+        }
+        
+        for palabra, banco, puntos, por_aparicion, requiere in PALABRAS_CLAVE_BANCO:
+            if not apariciones[palabra] or (requiere and not apariciones[requiere]):
+                continue
+            scores[banco] += puntos * apariciones[palabra] if por_aparicion else puntos
+        return scores
+
     def _parsear_texto(self, paginas_texto, parser_key):
         """
-        Método genérico para ejecutar parsers (Banamex, Inbursa).
+        Se ejecuta el parser correspondiente al banco detectado.
         """
-        parser = self.parsers.get(parser_key)
-        if not parser:
+        parsear = self.parsers.get(parser_key)
+        if not parsear:
             raise ValueError(f"No hay parser configurado para: {parser_key}")
+        return parsear(paginas_texto)
 
+    def _parsear_banamex(self, paginas_texto):
+        """
+        Se ejecuta el parser de Banamex sobre el texto completo.
+        """
         texto_completo = "\n".join(paginas_texto)
+        return banamex_empresa_parser.funcion_parsear_banamex_empresa(texto_completo)
 
-        if parser_key == "banamex_empresa":
-            if hasattr(parser, 'funcion_parsear_banamex_empresa'):
-                return parser.funcion_parsear_banamex_empresa(texto_completo)
-            else:
-                return parser.parsear_datos_generales([texto_completo])
-
-        elif parser_key == "inbursa_empresa":
-            datos = parser.parsear_datos_generales(paginas_texto) 
-            transacciones = parser.parsear_transacciones(paginas_texto, datos.get('saldo_inicial', 0))
-            return {
-                "datos_generales": datos,
-                "transacciones": transacciones
-            }
-        
-        return None
-
-    def _parsear_texto_mejorado(self, paginas_texto, parser_key):
+    def _parsear_bbva(self, paginas_texto):
         """
         Se ejecuta el parser mejorado de BBVA v2.0.
         """
-        if parser_key == "bbva_empresa":
-            parser = self.parsers[parser_key]
-            texto_completo = "\n".join(paginas_texto)
-            resultado = parser.parse_bbva_empresa(texto_completo)
-            return {
-                "datos_generales": resultado['metadata'],
-                "transacciones": resultado['transactions']
-            }
-        else:
-            return self._parsear_texto(paginas_texto, parser_key)
+        texto_completo = "\n".join(paginas_texto)
+        resultado = bbva_parser.parse_bbva_empresa(texto_completo)
+        return {
+            "datos_generales": resultado['metadata'],
+            "transacciones": resultado['transactions']
+        }
+
+    def _parsear_inbursa(self, paginas_texto):
+        """
+        Se ejecuta el parser de Inbursa (datos generales y transacciones).
+        """
+        # Se une el texto una sola vez para las dos etapas del parser
+        texto_completo = "\n".join(paginas_texto)
+        datos = inbursa_parser.parsear_datos_generales(texto_completo)
+        transacciones = inbursa_parser.parsear_transacciones(texto_completo, datos.get('saldo_inicial', 0))
+        return {
+            "datos_generales": datos,
+            "transacciones": transacciones
+        }
 
     def _default_json_serializer(self, obj):
         """
@@ -245,6 +488,33 @@ class BankStatementExtractor:
             return str(obj)
         raise TypeError(f"Objeto de tipo {obj.__class__.__name__} no es serializable en JSON")
 
+    def _escribir_json(self, ruta, datos):
+        """
+        Se escribe el JSON con orjson si está disponible, o con json como respaldo.
+        """
+        if orjson is not None:
+            contenido = orjson.dumps(
+                datos,
+                default=self._default_json_serializer,
+                option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS
+            )
+            with open(ruta, 'wb') as f:
+                f.write(contenido)
+            return
+        
+        with open(ruta, 'w', encoding='utf-8') as f:
+            json.dump(datos, f, indent=2, ensure_ascii=False, default=self._default_json_serializer)
+
+    def _formatear_fecha(self, fecha_str):
+        """
+        Se convierte una fecha dd/mm/aaaa al formato 01APR2024 sin depender del locale.
+        """
+        dia, mes, anio = (int(parte) for parte in fecha_str.split('/'))
+        # Se rechazan las fechas imposibles (ej: 31/02) igual que lo hacia strptime
+        if not (1 <= mes <= 12 and 1 <= anio and 1 <= dia <= calendar.monthrange(anio, mes)[1]):
+            raise ValueError(f"Fecha no valida: {fecha_str}")
+        return f"{dia:02d}{MESES_ABREVIADOS[mes]}{anio}"
+
     def _formatear_periodo(self, periodo_str):
         """
         Se formatea el periodo al formato requerido.
@@ -253,30 +523,24 @@ class BankStatementExtractor:
         if not periodo_str or periodo_str == 'SIN_PERIODO':
             return "FECHA_INICIO", "FECHA_FIN"
         
+        # Se evaluan los dos formatos en una sola pasada y se despacha segun el que coincidio
+        coincidencia = PATRON_PERIODO.match(periodo_str)
+        if not coincidencia:
+            return "FECHA_INICIO", "FECHA_FIN"
+        
         # CASO 1: El periodo ya está formateado (ej: 01ABR2024_30ABR2024)
         # Esto pasa con BBVA que devuelve el periodo listo en los metadatos
-        if re.match(r'^\d{2}[A-Z]{3}\d{4}_\d{2}[A-Z]{3}\d{4}$', periodo_str):
+        if coincidencia.lastgroup == 'formateado':
             partes = periodo_str.split('_')
             return partes[0], partes[1]
 
         # CASO 2: El periodo viene en formato texto (ej: DEL 01/04/2024 AL...)
         # Esto pasa con Banamex e Inbursa
         try:
-            patron_del_al = re.search(r"DEL\s+(\d{2}/\d{2}/\d{4})\s+AL\s+(\d{2}/\d{2}/\d{4})", periodo_str, re.IGNORECASE)
-            if patron_del_al:
-                fecha_ini_str = patron_del_al.group(1)
-                fecha_fin_str = patron_del_al.group(2)
-                
-                fecha_ini_obj = datetime.strptime(fecha_ini_str, "%d/%m/%Y")
-                fecha_fin_obj = datetime.strptime(fecha_fin_str, "%d/%m/%Y")
-                
-                mes_ini = self.MONTH_MAP.get(fecha_ini_obj.strftime("%B").lower(), fecha_ini_obj.strftime("%b").upper())
-                mes_fin = self.MONTH_MAP.get(fecha_fin_obj.strftime("%B").lower(), fecha_fin_obj.strftime("%b").upper())
-                
-                fecha_ini_formateada = f"{fecha_ini_obj.day:02d}{mes_ini}{fecha_ini_obj.year}"
-                fecha_fin_formateada = f"{fecha_fin_obj.day:02d}{mes_fin}{fecha_fin_obj.year}"
-                
-                return fecha_ini_formateada, fecha_fin_formateada
+            fecha_ini_formateada = self._formatear_fecha(coincidencia.group('inicio'))
+            fecha_fin_formateada = self._formatear_fecha(coincidencia.group('fin'))
+            
+            return fecha_ini_formateada, fecha_fin_formateada
         except Exception as e:
             # print(f"Error al formatear periodo: {e}")
             pass
@@ -291,8 +555,8 @@ class BankStatementExtractor:
         nombre = datos_generales.get('nombre_empresa') or datos_generales.get('Nombre de la empresa del estado de cuenta', 'SIN_NOMBRE')
         if not nombre: nombre = 'SIN_NOMBRE'
             
-        nombre_limpio = re.sub(r'[^A-Z0-9_\s]', '', str(nombre).upper())
-        nombre_limpio = re.sub(r'\s+', '_', nombre_limpio.strip())
+        # Una sola pasada de translate elimina los caracteres no validos; split une los espacios con '_'
+        nombre_limpio = '_'.join(str(nombre).upper().translate(TABLA_NOMBRE_ARCHIVO).split())
         
         # Recuperar periodo con fallback
         periodo = datos_generales.get('periodo') or datos_generales.get('Periodo del estado de cuenta', 'SIN_PERIODO')
@@ -315,8 +579,13 @@ class BankStatementExtractor:
             # Generar nombre usando la lógica robusta
             base_filename = self._formatear_nombre_archivo(datos_generales_limpios)
             
-            ingresos = [tx for tx in transacciones if tx.get('Clasificación') == 'Ingreso']
-            egresos = [tx for tx in transacciones if tx.get('Clasificación') == 'Egreso']
+            # Se separan ingresos y egresos en una sola pasada
+            ingresos, egresos = [], []
+            grupos = {'Ingreso': ingresos, 'Egreso': egresos}
+            for tx in transacciones:
+                grupo = grupos.get(tx.get('Clasificación'))
+                if grupo is not None:
+                    grupo.append(tx)
             
             ruta_datos = output_dir / f"{base_filename}_DATOS.json"
             ruta_ingresos = output_dir / f"{base_filename}_INGRESOS.json"
@@ -324,15 +593,14 @@ class BankStatementExtractor:
             
             output_dir.mkdir(parents=True, exist_ok=True)
             
-            # Usar default=self._default_json_serializer para evitar error de Decimal
-            with open(ruta_datos, 'w', encoding='utf-8') as f:
-                json.dump(datos_generales_limpios, f, indent=4, ensure_ascii=False, default=self._default_json_serializer)
-            
-            with open(ruta_ingresos, 'w', encoding='utf-8') as f:
-                json.dump(ingresos, f, indent=4, ensure_ascii=False, default=self._default_json_serializer)
-            
-            with open(ruta_egresos, 'w', encoding='utf-8') as f:
-                json.dump(egresos, f, indent=4, ensure_ascii=False, default=self._default_json_serializer)
+            # Se escriben los 3 archivos en paralelo (self._default_json_serializer evita el error de Decimal)
+            archivos = [
+                (ruta_datos, datos_generales_limpios),
+                (ruta_ingresos, ingresos),
+                (ruta_egresos, egresos)
+            ]
+            with ThreadPoolExecutor(max_workers=len(archivos)) as pool_escritura:
+                list(pool_escritura.map(lambda archivo: self._escribir_json(*archivo), archivos))
             
             print(f"Resultados guardados exitosamente en 3 archivos con base: {base_filename}")
             print(f"  - Datos generales: {ruta_datos.name}")
@@ -341,20 +609,63 @@ class BankStatementExtractor:
             
         except Exception as e:
             print(f"Error al guardar los 3 archivos de resultados: {e}")
-            import traceback
             traceback.print_exc()
 
     def procesar_pdf(self, pdf_path, output_dir):
         """
         Se ejecuta el pipeline completo de extraccion.
+        El PDF se lee a memoria una sola vez: con esos bytes se calcula la huella y se abre
+        el documento (solo si hace falta), que se comparte entre la extraccion nativa y la OCR.
+        """
+        pdf_bytes = pdf_path.read_bytes()
+        doc = None
+        intentado = False
+        
+        def obtener_documento():
+            nonlocal doc, intentado
+            if not intentado:
+                intentado = True
+                try:
+                    doc = fitz.open(stream=pdf_bytes, filetype="pdf")
+                except Exception as e:
+                    print(f"Error al abrir el PDF: {e}")
+            return doc
+        
+        try:
+            self._ejecutar_pipeline(pdf_path, output_dir, self._huella_pdf(pdf_bytes), obtener_documento)
+        finally:
+            if doc is not None:
+                doc.close()
+
+    def _ejecutar_pipeline(self, pdf_path, output_dir, huella, obtener_documento):
+        """
+        Se ejecutan los pasos de extraccion, parsing, validacion y guardado.
         """
         print(f"\n--- Iniciando Procesamiento Hibrido para: {pdf_path.name} ---")
         
-        print("Paso 1: Ejecutando extraccion Nativa (PyMuPDF)...")
-        paginas_nativas = self._extract_text_native(pdf_path)
+        # Se reutiliza el texto extraído si este mismo PDF ya se procesó antes
+        texto_cache = self._cargar_cache_texto(huella)
         
-        print("Paso 2: Ejecutando extraccion OCR (PaddleOCR)...")
-        paginas_ocr = self._extract_text_ocr(pdf_path)
+        if texto_cache is not None:
+            print("Paso 1: Se recupera el texto extraido desde la cache...")
+            paginas_nativas = texto_cache["nativas"]
+            paginas_ocr = texto_cache["ocr"]
+        else:
+            print("Paso 1: Ejecutando extraccion Nativa (PyMuPDF)...")
+            paginas_nativas = self._extract_text_native(obtener_documento())
+            paginas_ocr = None
+        
+        # Se omite el OCR si el texto nativo es suficiente; solo se ejecuta despues si falla el parser nativo
+        if paginas_ocr is not None:
+            print("Paso 2: Se usa el texto OCR recuperado desde la cache.")
+        elif self.force_ocr or not self._texto_nativo_suficiente(paginas_nativas):
+            print("Paso 2: Ejecutando extraccion OCR (PaddleOCR)...")
+            paginas_ocr = self._extract_text_ocr(obtener_documento())
+        else:
+            print("Paso 2: Texto nativo suficiente, se omite la extraccion OCR.")
+        
+        if texto_cache is None or texto_cache["ocr"] != paginas_ocr:
+            self._guardar_cache_texto(huella, paginas_nativas, paginas_ocr)
         
         print("Paso 3: Detectando banco y producto...")
         parser_key = self._detectar_banco_y_producto(paginas_nativas or paginas_ocr)
@@ -367,10 +678,7 @@ class BankStatementExtractor:
         print(f"Paso 4: Ejecutando parser especifico para '{parser_key}' (Intento 1: Nativo)...")
         resultado_final = None
         try:
-            if parser_key == "bbva_empresa":
-                resultado_final = self._parsear_texto_mejorado(paginas_nativas, parser_key)
-            else:
-                resultado_final = self._parsear_texto(paginas_nativas, parser_key)
+            resultado_final = self._parsear_texto(paginas_nativas, parser_key)
             
             print("Parsing completado.")
             num_transacciones = len(resultado_final.get('transacciones', []))
@@ -379,21 +687,32 @@ class BankStatementExtractor:
         except Exception as e:
             print(f"  > Advertencia: El texto nativo no pudo ser parseado. Reintentando con OCR.")
             print(f"  > Error nativo: {e}")
+        
+        # Se reintenta con OCR si el parser nativo fallo o no encontro transacciones
+        if resultado_final is None or not resultado_final.get('transacciones'):
+            if resultado_final is not None:
+                print("  > Advertencia: El texto nativo no produjo transacciones. Reintentando con OCR.")
             try:
-                if parser_key == "bbva_empresa":
-                    resultado_final = self._parsear_texto_mejorado(paginas_ocr, parser_key)
-                else:
-                    resultado_final = self._parsear_texto(paginas_ocr, parser_key)
+                if paginas_ocr is None:
+                    print("  > Ejecutando extraccion OCR (PaddleOCR)...")
+                    paginas_ocr = self._extract_text_ocr(obtener_documento())
+                    self._guardar_cache_texto(huella, paginas_nativas, paginas_ocr)
+                
+                resultado_ocr = self._parsear_texto(paginas_ocr, parser_key)
                 
                 print("Parsing completado con OCR.")
-                num_transacciones = len(resultado_final.get('transacciones', []))
+                num_transacciones = len(resultado_ocr.get('transacciones', []))
                 print(f"  > Se extrajeron {num_transacciones} transacciones")
                 
+                if resultado_final is None or num_transacciones > 0:
+                    resultado_final = resultado_ocr
+                
             except Exception as e2:
-                print(f"ERROR: No se pudieron extraer datos ni con metodo Nativo ni con OCR.")
-                import traceback
-                traceback.print_exc()
-                return
+                if resultado_final is None:
+                    print(f"ERROR: No se pudieron extraer datos ni con metodo Nativo ni con OCR.")
+                    traceback.print_exc()
+                    return
+                print(f"  > Advertencia: El OCR tampoco pudo ser parseado, se conserva el resultado nativo: {e2}")
 
         print("Paso 5: Ejecutando Validacion de Balance...")
         try:
@@ -416,14 +735,84 @@ class BankStatementExtractor:
         print(f"--- Procesamiento Finalizado para: {pdf_path.name} ---")
 
 
+def gpu_disponible():
+    """
+    Se detecta si Paddle fue compilado con CUDA y hay al menos una GPU visible.
+    """
+    try:
+        import paddle
+        return paddle.device.is_compiled_with_cuda() and paddle.device.cuda.device_count() > 0
+    except Exception:
+        return False
+
+def contar_paginas(pdf_path):
+    """
+    Se cuenta el numero de paginas del PDF (0 si no se puede abrir).
+    """
+    try:
+        with fitz.open(pdf_path, filetype="pdf") as doc:
+            return doc.page_count
+    except Exception:
+        return 0
+
+# Extractor propio de cada proceso del pool (el motor OCR, creado al primer uso, no se puede compartir entre procesos)
+_extractor_proceso = None
+
+def _inicializar_proceso(use_gpu, force_ocr, usar_cache, cpu_threads):
+    """
+    Se crea el extractor una sola vez por proceso trabajador.
+    """
+    global _extractor_proceso
+    # Se limitan los hilos de OpenCV a la parte de nucleos de este proceso para no sobresuscribir la CPU
+    cv2.setNumThreads(cpu_threads)
+    _extractor_proceso = BankStatementExtractor(
+        use_gpu=use_gpu, force_ocr=force_ocr, usar_cache=usar_cache, cpu_threads=cpu_threads
+    )
+
+def _procesar_pdf_seguro(extractor, pdf_path):
+    """
+    Se procesa un PDF sin propagar errores para no detener el resto del lote.
+    """
+    try:
+        extractor.procesar_pdf(pdf_path, OUTPUT_DIR)
+    except Exception as e:
+        print(f"ERROR INESPERADO: No se pudo procesar el archivo {pdf_path.name}.")
+        print(f"Detalle: {e}")
+
+def _procesar_pdf_en_proceso(pdf_path):
+    """
+    Se procesa un PDF con el extractor del proceso trabajador.
+    """
+    _procesar_pdf_seguro(_extractor_proceso, pdf_path)
+
 def main():
+    parser_argumentos = argparse.ArgumentParser(description="Extractor de estados de cuenta bancarios.")
+    parser_argumentos.add_argument(
+        "--force-ocr",
+        action="store_true",
+        help="Ejecuta el OCR aunque el texto nativo del PDF parezca suficiente."
+    )
+    parser_argumentos.add_argument(
+        "--sin-cache",
+        action="store_true",
+        help="Ignora el texto extraido en cache y vuelve a extraerlo de cada PDF."
+    )
+    parser_argumentos.add_argument(
+        "--cpu",
+        action="store_true",
+        help="Ejecuta el OCR en CPU aunque haya una GPU disponible."
+    )
+    argumentos = parser_argumentos.parse_args()
+    
     INPUT_DIR.mkdir(exist_ok=True)
     OUTPUT_DIR.mkdir(exist_ok=True)
     
     print(f"Iniciando el sistema de extraccion automatica.")
     print(f"Buscando archivos PDF en el directorio: {INPUT_DIR.resolve()}")
     
-    extractor = BankStatementExtractor(use_gpu=False)
+    # Se usa la GPU automaticamente si esta disponible
+    use_gpu = not argumentos.cpu and gpu_disponible()
+    print(f"Dispositivo de OCR: {'GPU' if use_gpu else 'CPU'}")
     
     pdf_files = list(INPUT_DIR.glob("*.pdf"))
     
@@ -433,12 +822,30 @@ def main():
 
     print(f"Se encontraron {len(pdf_files)} archivos PDF para procesar.")
     
-    for pdf_path in pdf_files:
-        try:
-            extractor.procesar_pdf(pdf_path, OUTPUT_DIR)
-        except Exception as e:
-            print(f"ERROR INESPERADO: No se pudo procesar el archivo {pdf_path.name}.")
-            print(f"Detalle: {e}")
+    # Se usa un proceso por cada dos nucleos para dejar margen a los hilos internos de PaddleOCR;
+    # con GPU se usa uno solo para no competir por la tarjeta
+    num_procesos = 1 if use_gpu else max(1, min(len(pdf_files), (os.cpu_count() or 1) // 2))
+    # Se reparten los nucleos entre los procesos para no sobresuscribir la CPU
+    cpu_threads = max(1, (os.cpu_count() or 1) // num_procesos)
+    
+    if num_procesos == 1:
+        extractor = BankStatementExtractor(
+            use_gpu=use_gpu, force_ocr=argumentos.force_ocr, usar_cache=not argumentos.sin_cache,
+            cpu_threads=cpu_threads
+        )
+        for pdf_path in pdf_files:
+            _procesar_pdf_seguro(extractor, pdf_path)
+    else:
+        print(f"Se procesaran los archivos en paralelo con {num_procesos} procesos.")
+        # Balanceo de carga: se reparten primero los PDFs mas largos para que uno grande no
+        # quede corriendo solo al final del lote. Cuesta abrir cada PDF una vez en este proceso.
+        paginas_por_pdf = {pdf_path: contar_paginas(pdf_path) for pdf_path in pdf_files}
+        pdf_files.sort(key=paginas_por_pdf.get, reverse=True)
+        # Se usa "spawn": Paddle y PyMuPDF no son seguros tras un fork del proceso principal
+        contexto = multiprocessing.get_context("spawn")
+        with contexto.Pool(processes=num_procesos, initializer=_inicializar_proceso, initargs=(use_gpu, argumentos.force_ocr, not argumentos.sin_cache, cpu_threads)) as pool:
+            for _ in pool.imap_unordered(_procesar_pdf_en_proceso, pdf_files):
+                pass
             
     print("\nProcesamiento de todos los archivos completado.")
 
@@ -23,6 +23,7 @@ from utils.field_extractors import (
     funcion_extraer_cuentas_origen_destino,
     funcion_es_codigo_cargo
 )
+from utils.motor_regex import compilar_patron
 from utils.validators import limpiar_monto
 
 PATRONES_SALDO_FINAL = [
@@ -31,6 +32,15 @@ PATRONES_SALDO_FINAL = [
     r'SALDO AL \d{2}/[A-Z]{3}/\d{4}.*?([$]?[\d,]+\.\d{2})'
 ]
 
+# Patrones de transacciones (se compilan una sola vez porque se aplican en cada línea/grupo)
+PATRON_INICIO_TRANSACCION = compilar_patron(r'^\s*(\d{1,2}\s+(?:ENE|FEB|MAR|ABR|MAY|JUN|JUL|AGO|SEP|OCT|NOV|DIC))', re.IGNORECASE)
+PATRON_FECHA_TRANSACCION = compilar_patron(r'^(\d{1,2}\s+[A-Z]{3})', re.IGNORECASE)
+PATRON_MONTO = compilar_patron(r'(\d{1,3}(?:,\d{3})*\.\d{2})')
+PATRON_ESPACIOS = compilar_patron(r'\s+')
+PATRON_REFERENCIA_BNET = compilar_patron(r'\b(BNET\w+)\b')
+PATRON_SUCURSAL = compilar_patron(r'SUC\s+(\d{3,4})')
+PATRON_SOLO_NUMEROS = compilar_patron(r'^[\d\.:\(\)]+$')
+
 def funcion_parsear_datos_generales(paginas_texto):
     texto_completo = "\n".join(paginas_texto)
     return funcion_extraer_metadatos_completos(texto_completo)
@@ -279,12 +289,10 @@ def funcion_agrupar_lineas_por_fecha(lineas):
     # Lógica v9.3
     grupos = []
     grupo_actual = []
-    patron = re.compile(r'^\s*(\d{1,2}\s+(?:ENE|FEB|MAR|ABR|MAY|JUN|JUL|AGO|SEP|OCT|NOV|DIC))', re.IGNORECASE)
-    
     for l in lineas:
         ls = l.strip()
         if not ls: continue
-        if patron.match(ls):
+        if PATRON_INICIO_TRANSACCION.match(ls):
             if grupo_actual: grupos.append(grupo_actual)
             grupo_actual = [ls]
         else:
@@ -297,7 +305,7 @@ def funcion_procesar_grupo_transaccion(lineas, anio, contador, cuenta_propia):
     bloque_texto = " ".join(lineas)
     
     # 1. Fecha
-    m_fecha = re.match(r'^(\d{1,2}\s+[A-Z]{3})', lineas[0], re.IGNORECASE)
+    m_fecha = PATRON_FECHA_TRANSACCION.match(lineas[0])
     if not m_fecha: return None
     
     fecha_raw = m_fecha.group(1)
@@ -306,7 +314,7 @@ def funcion_procesar_grupo_transaccion(lineas, anio, contador, cuenta_propia):
     
     # 2. Montos (Estrategia mejorada v9.6)
     # Buscamos todos los posibles montos al final.
-    montos = re.findall(r'(\d{1,3}(?:,\d{3})*\.\d{2})', bloque_texto)
+    montos = PATRON_MONTO.findall(bloque_texto)
     monto = 0.0
     texto_analisis = bloque_texto
     
@@ -336,10 +344,14 @@ def funcion_procesar_grupo_transaccion(lineas, anio, contador, cuenta_propia):
     
     # 4. Descripción y Nombre Completo (Limpieza final v9.6)
     # Quitar la fecha del inicio
-    desc_base = re.sub(r'^' + re.escape(fecha_raw), '', texto_analisis, flags=re.IGNORECASE).strip()
+    desc_base = texto_analisis
+    if desc_base[:len(fecha_raw)].upper() == fecha_raw.upper():
+        desc_base = desc_base[len(fecha_raw):]
+    desc_base = desc_base.strip()
     
     # Quitar espacios dobles y basura residual
-    nombre_completo = re.sub(r'\s+', ' ', desc_base).strip()
+    nombre_completo = PATRON_ESPACIOS.sub(' ', desc_base).strip()
+    nombre_upper = nombre_completo.upper()
     
     # 5. Beneficiario
     beneficiario = funcion_extraer_beneficiario_correcto(lineas, "", es_egreso)
@@ -349,7 +361,7 @@ def funcion_procesar_grupo_transaccion(lineas, anio, contador, cuenta_propia):
     # 6. Referencia
     referencia = funcion_extraer_referencia_mejorada(lineas)
     if not referencia or referencia == "00000000":
-        m_bnet = re.search(r'\b(BNET\w+)\b', nombre_completo)
+        m_bnet = PATRON_REFERENCIA_BNET.search(nombre_completo)
         if m_bnet: referencia = m_bnet.group(1)
         
     # 7. Cuentas
@@ -359,19 +371,19 @@ def funcion_procesar_grupo_transaccion(lineas, anio, contador, cuenta_propia):
     
     # 8. Método de Pago
     metodo_pago = funcion_determinar_metodo_pago("00", nombre_completo)
-    if "CHEQUE" in nombre_completo.upper(): metodo_pago = "Cheque"
-    elif "DEPOSITO" in nombre_completo.upper() and "EFECTIVO" in nombre_completo.upper(): metodo_pago = "Efectivo"
-    elif "SPEI" in nombre_completo.upper(): metodo_pago = "SPEI"
-    elif "DOMI" in nombre_completo.upper(): metodo_pago = "Domiciliación"
+    if "CHEQUE" in nombre_upper: metodo_pago = "Cheque"
+    elif "DEPOSITO" in nombre_upper and "EFECTIVO" in nombre_upper: metodo_pago = "Efectivo"
+    elif "SPEI" in nombre_upper: metodo_pago = "SPEI"
+    elif "DOMI" in nombre_upper: metodo_pago = "Domiciliación"
     elif metodo_pago == "Otro": metodo_pago = "Transferencia Electrónica"
 
     # 9. Tipo de Transacción
-    if "IVA" in nombre_completo.upper(): tipo_tx = "Impuesto"
-    elif "COMISION" in nombre_completo.upper(): tipo_tx = "Comisión"
-    elif "INTERES" in nombre_completo.upper(): tipo_tx = "Interés"
-    elif "CHEQUE" in nombre_completo.upper(): tipo_tx = "Cheque"
-    elif "DEPOSITO" in nombre_completo.upper(): tipo_tx = "Depósito"
-    elif "PAGO" in nombre_completo.upper(): tipo_tx = "Pago"
+    if "IVA" in nombre_upper: tipo_tx = "Impuesto"
+    elif "COMISION" in nombre_upper: tipo_tx = "Comisión"
+    elif "INTERES" in nombre_upper: tipo_tx = "Interés"
+    elif "CHEQUE" in nombre_upper: tipo_tx = "Cheque"
+    elif "DEPOSITO" in nombre_upper: tipo_tx = "Depósito"
+    elif "PAGO" in nombre_upper: tipo_tx = "Pago"
     else: tipo_tx = "Transferencia"
 
     # 10. Nombre Resumido
@@ -383,7 +395,7 @@ def funcion_procesar_grupo_transaccion(lineas, anio, contador, cuenta_propia):
     )
     
     # Sucursal
-    m_suc = re.search(r'SUC\s+(\d{3,4})', nombre_completo)
+    m_suc = PATRON_SUCURSAL.search(nombre_completo)
     sucursal = m_suc.group(1) if m_suc else ""
 
     return {
@@ -421,7 +433,7 @@ def _extraer_beneficiario_banamex_legacy(desc):
     palabras = desc.split()
     candidatos = []
     for p in palabras:
-        if p.upper() not in stopwords and not re.match(r'^[\d\.:\(\)]+$', p) and len(p) > 2:
+        if p.upper() not in stopwords and not PATRON_SOLO_NUMEROS.match(p) and len(p) > 2:
             candidatos.append(p)
     return " ".join(candidatos[:6])
 
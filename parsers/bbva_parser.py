@@ -28,6 +28,43 @@ from utils.field_extractors import (
     funcion_extraer_cuentas_origen_destino,
     funcion_es_codigo_cargo 
 )
+from utils.motor_regex import compilar_patron
+
+# Patrones de transacciones (se compilan una sola vez porque se aplican en cada línea/grupo)
+PATRON_FECHA_TRANSACCION = compilar_patron(r'^\s*(\d{2}/[A-Z]{3})\s+(\d{2}/[A-Z]{3})')
+PATRON_BASE_TRANSACCION = compilar_patron(r'^\s*(\d{2}/[A-Z]{3})\s+(\d{2}/[A-Z]{3})\s+([A-Z]\d{2})\s+(.*)')
+PATRON_MONTO = compilar_patron(r'([\d,.-]+\.\d{2})')
+COLUMNA_MONTO = r'((?:[\d,.-]+\.\d{2})|(?:\s*-\s*))'
+PATRON_COLUMNAS = compilar_patron(
+    rf'^\s*\d{{2}}/[A-Z]{{3}}\s+\d{{2}}/[A-Z]{{3}}\s+[A-Z]\d{{2}}\s+(.*?)\s+{COLUMNA_MONTO}\s+{COLUMNA_MONTO}\s+.*$'
+)
+PATRON_SUCURSAL = compilar_patron(r'SUC[:\s]+(\d{4})', re.IGNORECASE)
+PATRON_MAYUSCULAS = compilar_patron(r'^[A-Z\s.]+$')
+
+# Líneas de encabezado/pie que cortan un grupo de transacción (un solo patrón con todas las alternativas)
+PATRONES_IGNORAR = [
+    r'INFORMACI[ÓO]N\s+FINANCIERA',
+    r'ESTADO\s+DE\s+CUENTA',
+    r'PAGINA\s+\d+',
+    r'MAESTRA\s+PYME',
+    r'DOMICILIO\s+FISCAL',
+    r'MONEDA\s+NACIONAL',
+    r'BBVA\s+MEXICO',
+    r'^[\s\-=]+$',
+    r'Estimado\s+Cliente',
+    r'FECHA\s+SALDO', 
+    r'OPER\s+LIQ',
+    r'COD\.\s+DESCRIPCI[ÓO]N'
+]
+PATRON_LINEA_IGNORAR = compilar_patron("|".join(f"(?:{patron})" for patron in PATRONES_IGNORAR), re.IGNORECASE)
+
+# Palabras que indican que una línea en mayúsculas no es el nombre de un beneficiario
+PALABRAS_NO_BENEFICIARIO = (
+    'BBVA', 'BNET', 'REF', 'SPEI', 'RFC', 'AUT', 'CUENTA', 'PAGO',
+    'ESTADO DE CUENTA', 'INFORMACION', 'TECNOLOGIAS', 'INNOVATION',
+    'SA DE CV', 'BMRCASH', 'PRESTAMO', 'FECHA', 'SALDO', 'OPER', 'LIQ',
+    'COD. DESCRIPCION', 'REFERENCIA', 'CARGOS', 'ABONOS'
+)
 
 
 def funcion_parsear_bbva_empresa(texto_completo, datos_ocr=None):
@@ -409,15 +446,10 @@ def _es_linea_beneficiario(linea):
     if not linea_limpia:
         return False
     
-    es_mayusculas = bool(re.match(r'^[A-Z\s.]+$', linea_limpia))
+    es_mayusculas = bool(PATRON_MAYUSCULAS.match(linea_limpia))
     tiene_palabras = len(linea_limpia.split()) >= 2
     es_largo_minimo = len(linea_limpia) > 5
-    no_es_keyword = not any(kw in linea_limpia for kw in [
-        'BBVA', 'BNET', 'REF', 'SPEI', 'RFC', 'AUT', 'CUENTA', 'PAGO',
-        'ESTADO DE CUENTA', 'INFORMACION', 'TECNOLOGIAS', 'INNOVATION',
-        'SA DE CV', 'BMRCASH', 'PRESTAMO', 'FECHA', 'SALDO', 'OPER', 'LIQ',
-        'COD. DESCRIPCION', 'REFERENCIA', 'CARGOS', 'ABONOS'
-    ])
+    no_es_keyword = not any(kw in linea_limpia for kw in PALABRAS_NO_BENEFICIARIO)
     
     return es_mayusculas and es_largo_minimo and no_es_keyword and tiene_palabras
 
@@ -430,23 +462,6 @@ def funcion_agrupar_lineas_transacciones(lineas):
     grupos = []
     grupo_actual = []
     
-    patron_fecha = re.compile(r'^\s*(\d{2}/[A-Z]{3})\s+(\d{2}/[A-Z]{3})')
-    
-    patrones_ignorar = [
-        r'INFORMACI[ÓO]N\s+FINANCIERA',
-        r'ESTADO\s+DE\s+CUENTA',
-        r'PAGINA\s+\d+',
-        r'MAESTRA\s+PYME',
-        r'DOMICILIO\s+FISCAL',
-        r'MONEDA\s+NACIONAL',
-        r'BBVA\s+MEXICO',
-        r'^[\s\-=]+$',
-        r'Estimado\s+Cliente',
-        r'FECHA\s+SALDO', 
-        r'OPER\s+LIQ',
-        r'COD\.\s+DESCRIPCI[ÓO]N'
-    ]
-    
     linea_anterior = ""
 
     for linea in lineas:
@@ -455,20 +470,14 @@ def funcion_agrupar_lineas_transacciones(lineas):
         if not linea_limpia:
             continue
         
-        es_ignorar = False
-        for patron_ignorar in patrones_ignorar:
-            if re.search(patron_ignorar, linea, re.IGNORECASE):
-                es_ignorar = True
-                break
-        
-        if es_ignorar:
+        if PATRON_LINEA_IGNORAR.search(linea):
             if grupo_actual: 
                 grupos.append(grupo_actual)
                 grupo_actual = []
             linea_anterior = "" 
             continue
         
-        if patron_fecha.match(linea):
+        if PATRON_FECHA_TRANSACCION.match(linea):
             if grupo_actual: 
                 grupos.append(grupo_actual)
             
@@ -499,10 +508,9 @@ def funcion_parsear_transaccion_individual(lineas_grupo, metadatos, contador_tra
     # Se busca la línea de fecha
     linea_principal = ""
     indice_linea_principal = -1
-    patron_fecha = re.compile(r'^\s*(\d{2}/[A-Z]{3})\s+(\d{2}/[A-Z]{3})')
     
     for i, linea in enumerate(lineas_grupo):
-        if patron_fecha.match(linea):
+        if PATRON_FECHA_TRANSACCION.match(linea):
             linea_principal = linea
             indice_linea_principal = i
             break
@@ -511,7 +519,7 @@ def funcion_parsear_transaccion_individual(lineas_grupo, metadatos, contador_tra
         return None
 
     # Se extraen los datos base
-    match_base = re.match(r'^\s*(\d{2}/[A-Z]{3})\s+(\d{2}/[A-Z]{3})\s+([A-Z]\d{2})\s+(.*)', linea_principal)
+    match_base = PATRON_BASE_TRANSACCION.match(linea_principal)
     if not match_base:
         return None
     
@@ -528,7 +536,7 @@ def funcion_parsear_transaccion_individual(lineas_grupo, metadatos, contador_tra
 
     # --- INICIO LÓGICA v5.8: Multi-Layout ---
     
-    montos_encontrados = re.findall(r'([\d,.-]+\.\d{2})', linea_principal)
+    montos_encontrados = PATRON_MONTO.findall(linea_principal)
     num_montos = len(montos_encontrados)
 
     if layout == 'simple':
@@ -573,9 +581,8 @@ def funcion_parsear_transaccion_individual(lineas_grupo, metadatos, contador_tra
             
     else:
         # --- Formato Columnas (Marzo, Sept, etc.) ---
-        col_monto = r'((?:[\d,.-]+\.\d{2})|(?:\s*-\s*))'
         # Se busca un patrón que TENGA columnas
-        patron_cols = re.match(rf'^\s*\d{{2}}/[A-Z]{{3}}\s+\d{{2}}/[A-Z]{{3}}\s+[A-Z]\d{{2}}\s+(.*?)\s+{col_monto}\s+{col_monto}\s+.*$', linea_principal)
+        patron_cols = PATRON_COLUMNAS.match(linea_principal)
         
         if not patron_cols:
             # Esta línea no tiene el formato de columnas (ej. una A15 en un PDF de columnas)
@@ -650,7 +657,7 @@ def funcion_parsear_transaccion_individual(lineas_grupo, metadatos, contador_tra
     fecha_formateada = funcion_extraer_fecha_normalizada(fecha_liq)
     
     # Extraer sucursal (si existe)
-    match_sucursal = re.search(r'SUC[:\s]+(\d{4})', ' '.join(lineas_grupo), re.IGNORECASE)
+    match_sucursal = PATRON_SUCURSAL.search(' '.join(lineas_grupo))
     sucursal = match_sucursal.group(1) if match_sucursal else ""
 
     # Construir el diccionario de transacción
@@ -27,6 +27,7 @@ from utils.field_extractors import (
     funcion_determinar_metodo_pago,
     funcion_extraer_cuentas_origen_destino
 )
+from utils.motor_regex import compilar_patron
 
 # Se definen los meses en español para conversión rápida local si falla field_extractors
 MESES_ESPANOL = {
@@ -35,6 +36,16 @@ MESES_ESPANOL = {
     'SEP': '09', 'OCT': '10', 'NOV': '11', 'DIC': '12'
 }
 
+# Patrones de transacciones (se compilan una sola vez porque se aplican en cada línea/bloque)
+# Inicio de transacción: Mes abreviado + Dia (Ej: ENE 01, ABR. 30)
+PATRON_INICIO_TRANSACCION = compilar_patron(r'^(ENE|FEB|MAR|ABR|MAY|JUN|JUL|AGO|SEP|OCT|NOV|DIC)\.?\s*(\d{1,2})', re.IGNORECASE)
+PATRON_MONTO = compilar_patron(r'([\d,]+\.\d{2})')
+PATRON_CLAVE_RASTREO = compilar_patron(r'(?:CLAVE DE RASTREO|RASTREO)\s*[:\.]?\s*([A-Z0-9]+)')
+PATRON_BENEFICIARIO_EXPLICITO = compilar_patron(r'(?:BENEFICIARIO|ORDENANTE)\s*[:\.]?\s*([A-Z\s\.,&]+)')
+
+# Encabezados que se repiten en cada página dentro del flujo de movimientos
+ENCABEZADOS_RECURRENTES = ("SALDO ANTERIOR", "SALDO ACTUAL", "PÁGINA", "ESTADO DE CUENTA")
+
 def funcion_extraer_metadatos(texto):
     """
     Extrae metadatos con claves compatibles y robustas.
@@ -139,7 +150,7 @@ def funcion_construir_transaccion_bbva_style(bloque_raw, fecha_str, anio, contad
     # Regex específica para líneas de monto en Inbursa (flotando a la derecha o solos)
     for linea in lineas:
         # Busca montos al final de la línea o líneas que son solo montos
-        matches = re.findall(r'([\d,]+\.\d{2})', linea)
+        matches = PATRON_MONTO.findall(linea)
         for m in matches:
             valor = funcion_extraer_monto(m)
             montos_encontrados.append(valor)
@@ -189,7 +200,7 @@ def funcion_construir_transaccion_bbva_style(bloque_raw, fecha_str, anio, contad
         pass 
 
     # Buscar "Clave de Rastreo" (Típico Inbursa) para agregarla a referencia si hace falta
-    match_rastreo = re.search(r'(?:CLAVE DE RASTREO|RASTREO)\s*[:\.]?\s*([A-Z0-9]+)', texto_bloque)
+    match_rastreo = PATRON_CLAVE_RASTREO.search(texto_bloque)
     clave_rastreo = match_rastreo.group(1) if match_rastreo else ""
     
     # Código simulado para compatibilidad con funciones BBVA
@@ -198,7 +209,7 @@ def funcion_construir_transaccion_bbva_style(bloque_raw, fecha_str, anio, contad
     # Beneficiario
     # Inbursa a veces etiqueta explícitamente o pone el nombre después del concepto
     beneficiario = ""
-    match_ben_explicit = re.search(r'(?:BENEFICIARIO|ORDENANTE)\s*[:\.]?\s*([A-Z\s\.,&]+)', texto_bloque)
+    match_ben_explicit = PATRON_BENEFICIARIO_EXPLICITO.search(texto_bloque)
     if match_ben_explicit:
         beneficiario = match_ben_explicit.group(1).strip()
     else:
@@ -282,18 +293,16 @@ def funcion_extraer_transacciones_inbursa_core(texto, saldo_inicial):
     anio = funcion_extraer_anio_contexto(texto)
     saldo_tracking = saldo_inicial
     
-    # Regex para detectar inicio de transacción: Mes abreviado + Dia (Ej: ENE 01, ABR. 30)
-    patron_inicio = re.compile(r'^(ENE|FEB|MAR|ABR|MAY|JUN|JUL|AGO|SEP|OCT|NOV|DIC)\.?\s*(\d{1,2})', re.IGNORECASE)
-    
     bloque_actual = []
     fecha_actual = ""
     
     for linea in lineas:
         linea_limpia = linea.strip()
-        match_fecha = patron_inicio.match(linea_limpia)
+        match_fecha = PATRON_INICIO_TRANSACCION.match(linea_limpia)
         
         # Ignorar encabezados recurrentes dentro del flujo
-        if any(x in linea_limpia.upper() for x in ["SALDO ANTERIOR", "SALDO ACTUAL", "PÁGINA", "ESTADO DE CUENTA"]):
+        linea_upper = linea_limpia.upper()
+        if any(x in linea_upper for x in ENCABEZADOS_RECURRENTES):
              if not match_fecha: continue
 
         if match_fecha:
@@ -328,12 +337,20 @@ def funcion_extraer_transacciones_inbursa_core(texto, saldo_inicial):
 # FUNCIONES PÚBLICAS REQUERIDAS POR main_extractor.py
 # =============================================================================
 
+def _unir_paginas(paginas_texto) -> str:
+    """
+    Acepta la lista de páginas o el texto ya unido (evita unirlo dos veces).
+    """
+    if isinstance(paginas_texto, str):
+        return paginas_texto
+    return "\n".join(paginas_texto)
+
 def parsear_datos_generales(paginas_texto: list) -> dict:
     """
     Punto de entrada 1: Extrae metadatos.
     Main espera un dict con claves como 'saldo_inicial' para pasar al siguiente paso.
     """
-    texto_completo = "\n".join(paginas_texto)
+    texto_completo = _unir_paginas(paginas_texto)
     return funcion_extraer_metadatos(texto_completo)
 
 def parsear_transacciones(paginas_texto: list, saldo_inicial: float) -> list:
@@ -341,7 +358,7 @@ def parsear_transacciones(paginas_texto: list, saldo_inicial: float) -> list:
     Punto de entrada 2: Extrae transacciones.
     Main espera una lista de diccionarios.
     """
-    texto_completo = "\n".join(paginas_texto)
+    texto_completo = _unir_paginas(paginas_texto)
     print(f"   > Iniciando extracción detallada Inbursa (v11.0)... Saldo Inicial Ref: {saldo_inicial}")
     return funcion_extraer_transacciones_inbursa_core(texto_completo, saldo_inicial)
 
@@ -11,6 +11,20 @@ import re
 from datetime import datetime
 import sys
 import os # Asegurarse que os esté importado
+from .motor_regex import compilar_patron
+
+
+# Se precompilan los patrones que se evalúan por cada transacción
+PATRON_COMERCIO_A15 = compilar_patron(r'A15\s+([A-Z0-9*#\s_]+?)(?:\s+RFC:|\s+USD|\s+\d{2}:\d{2})')
+PATRON_ESPACIOS = compilar_patron(r'\s+')
+PATRON_GUIONES = compilar_patron(r'-+')
+PATRON_REFERENCIA = compilar_patron(r'Ref\.\s+([A-Z0-9*#]+)\b', re.IGNORECASE)
+PATRON_AUTORIZACION = compilar_patron(r'AUT[:\s]+(\d{6,})', re.IGNORECASE)
+PATRON_BNET = compilar_patron(r'\b(BNET[A-Z0-9]{10,})\b')
+PATRON_REFBNTC = compilar_patron(r'\b(REFBNTC[A-Z0-9]{8,})\b')
+PATRON_FOLIO_LINEA = compilar_patron(r'^\s*(\d{8,15})\s*$')
+PATRON_REFERENCIA_NUMERICA = compilar_patron(r'Ref\.\s+(\d+)\b')
+PATRON_CUENTAS = compilar_patron(r'\b(\d{10,18})\b')
 
 
 def funcion_extraer_fecha_normalizada(fecha_texto):
@@ -160,10 +174,10 @@ def funcion_extraer_beneficiario_correcto(lineas_grupo, codigo, es_cargo):
     # Para pagos con tarjeta (A15)
     if codigo == 'A15':
         # Se extrae el nombre del comercio (ej. GOOGLE, VIVA AEROBUS, LIVERPOOL)
-        match_comercio = re.search(r'A15\s+([A-Z0-9*#\s_]+?)(?:\s+RFC:|\s+USD|\s+\d{2}:\d{2})', ' '.join(lineas_grupo))
+        match_comercio = PATRON_COMERCIO_A15.search(' '.join(lineas_grupo))
         if match_comercio:
             comercio = match_comercio.group(1).strip().replace('*', ' ').replace('#', ' ')
-            comercio = re.sub(r'\s+', ' ', comercio) # Se limpian espacios extra
+            comercio = PATRON_ESPACIOS.sub(' ', comercio) # Se limpian espacios extra
             return comercio.upper()
 
     return ""
@@ -177,25 +191,25 @@ def funcion_extraer_referencia_mejorada(lineas_grupo):
     texto_completo = ' '.join(lineas_grupo)
     
     # 1. Se busca el patrón "Ref. XXXXX"
-    match_ref = re.search(r'Ref\.\s+([A-Z0-9*#]+)\b', texto_completo, re.IGNORECASE)
+    match_ref = PATRON_REFERENCIA.search(texto_completo)
     if match_ref:
         referencia = match_ref.group(1)
         if '******' not in referencia: # Se ignora la ref de tarjeta
             return referencia
 
     # 2. Se busca el patrón "AUT XXXXX" (Autorización)
-    match_aut = re.search(r'AUT[:\s]+(\d{6,})', texto_completo, re.IGNORECASE)
+    match_aut = PATRON_AUTORIZACION.search(texto_completo)
     if match_aut:
         return match_aut.group(1)
         
     # 3. Se buscan códigos alfanuméricos largos (BNET, REFBNTC)
     for linea in lineas_grupo:
         # (ej. BNET01002410020040771417)
-        match_bnet = re.search(r'\b(BNET[A-Z0-9]{10,})\b', linea)
+        match_bnet = PATRON_BNET.search(linea)
         if match_bnet:
             return match_bnet.group(1)
         # (ej. REFBNTC00335630)
-        match_refbntc = re.search(r'\b(REFBNTC[A-Z0-9]{8,})\b', linea)
+        match_refbntc = PATRON_REFBNTC.search(linea)
         if match_refbntc:
             return match_refbntc.group(1)
             
@@ -203,12 +217,12 @@ def funcion_extraer_referencia_mejorada(lineas_grupo):
     for linea in lineas_grupo[1:]: 
         if _es_linea_beneficiario(linea):
             continue
-        match_num = re.search(r'^\s*(\d{8,15})\s*$', linea)
+        match_num = PATRON_FOLIO_LINEA.search(linea)
         if match_num:
             return match_num.group(1)
             
     # 5. Fallback: Se busca un número de referencia en la descripción
-    match_ref_desc = re.search(r'Ref\.\s+(\d+)\b', texto_completo)
+    match_ref_desc = PATRON_REFERENCIA_NUMERICA.search(texto_completo)
     if match_ref_desc:
         return match_ref_desc.group(1)
 
@@ -321,8 +335,8 @@ def funcion_limpiar_nombre_empresa(nombre_empresa):
     for caracter in caracteres_invalidos:
         nombre_limpio = nombre_limpio.replace(caracter, '-')
     
-    nombre_limpio = re.sub(r'-+', '-', nombre_limpio)
-    nombre_limpio = re.sub(r'\s+', ' ', nombre_limpio)
+    nombre_limpio = PATRON_GUIONES.sub('-', nombre_limpio)
+    nombre_limpio = PATRON_ESPACIOS.sub(' ', nombre_limpio)
     
     return nombre_limpio.strip()
 
@@ -394,7 +408,7 @@ def funcion_extraer_cuentas_origen_destino(lineas_grupo, es_cargo, cuenta_propia
     texto_completo = ' '.join(lineas_grupo)
     
     # Se buscan todas las cuentas/clabes en el texto
-    cuentas = re.findall(r'\b(\d{10,18})\b', texto_completo)
+    cuentas = PATRON_CUENTAS.findall(texto_completo)
     
     cuenta_tercero = ""
     for cuenta in cuentas:
@@ -3,23 +3,69 @@
 Modulo de preprocesamiento de imagenes para mejorar OCR.
 """
 
+import threading
+
 import cv2
 import numpy as np
-from PIL import Image
 import fitz
 
+# Zoom de renderizado (72 DPI = 1.0): 2.5 (180 DPI) por defecto, 150 DPI si la letra ya es grande
+ZOOM_POR_DEFECTO = 2.5
+ZOOM_LETRA_GRANDE = 150 / 72
+TAMANO_LETRA_GRANDE = 12
+
+# Buffer de render por hilo: la imagen se consume antes de renderizar la siguiente pagina
+_buffer_render = threading.local()
+
+
+def select_zoom_for_page(pdf_page):
+    """
+    Elige el zoom segun el tamano de letra de la capa de texto de la pagina.
+    Las paginas escaneadas (sin capa de texto) usan el zoom por defecto.
+    """
+    tamanos = []
+    try:
+        for bloque in pdf_page.get_text("dict", flags=0)["blocks"]:
+            for linea in bloque.get("lines", ()):
+                tamanos.extend(span["size"] for span in linea["spans"] if span["text"].strip())
+    except Exception:
+        return ZOOM_POR_DEFECTO
+    
+    if tamanos and float(np.median(tamanos)) >= TAMANO_LETRA_GRANDE:
+        return ZOOM_LETRA_GRANDE
+    return ZOOM_POR_DEFECTO
+
 
-def preprocess_page_for_ocr(pdf_page, zoom_factor=2.5):
-    """Convierte pagina PDF a imagen de alta calidad para OCR."""
+def preprocess_page_for_ocr(pdf_page, zoom_factor=2.5, out=None):
+    """
+    Convierte pagina PDF a imagen de alta calidad para OCR.
+    Si out tiene el mismo tamano que la pagina, se escribe ahi en lugar de reservar otra imagen.
+    """
     mat = fitz.Matrix(zoom_factor, zoom_factor)
-    pix = pdf_page.get_pixmap(matrix=mat, alpha=False)
-    
-    img = np.frombuffer(pix.samples, dtype=np.uint8).reshape(pix.h, pix.w, pix.n)
-    
-    if pix.n == 3:
-        img = cv2.cvtColor(img, cv2.COLOR_RGB2GRAY)
+    # Se renderiza directo en escala de grises para evitar la conversion RGB -> gris
+    pix = pdf_page.get_pixmap(matrix=mat, colorspace=fitz.csGRAY, alpha=False)
+    destino = out if out is not None and out.shape == (pix.h, pix.w) else None
+    
+    # samples_mv expone el buffer del pixmap sin copiarlo a un bytes intermedio
+    muestras = np.frombuffer(pix.samples_mv, dtype=np.uint8)
+    
+    if pix.n == 1:
+        origen = muestras.reshape(pix.h, pix.w)
+        if destino is None:
+            img = origen.copy()
+        else:
+            np.copyto(destino, origen)
+            img = destino
+    elif pix.n == 3:
+        img = cv2.cvtColor(muestras.reshape(pix.h, pix.w, 3), cv2.COLOR_RGB2GRAY, dst=destino)
     elif pix.n == 4:
-        img = cv2.cvtColor(img, cv2.COLOR_RGBA2GRAY)
+        img = cv2.cvtColor(muestras.reshape(pix.h, pix.w, 4), cv2.COLOR_RGBA2GRAY, dst=destino)
+    else:
+        img = muestras.reshape(pix.h, pix.w, pix.n).copy()
+    
+    # El arreglo ya no apunta a la memoria del pixmap, se puede liberar
+    del muestras
+    pix = None
     
     return img
 
@@ -33,18 +79,22 @@ def apply_advanced_preprocessing(image):
     deskewed = deskew_image(denoised)
     
     kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (2, 2))
-    morphed = cv2.morphologyEx(deskewed, cv2.MORPH_CLOSE, kernel)
+    # Las imagenes intermedias son propias de esta funcion, se cierra sobre el mismo buffer
+    morphed = cv2.morphologyEx(deskewed, cv2.MORPH_CLOSE, kernel, dst=deskewed)
     
     return morphed
 
 
 def deskew_image(image):
     """Corrige la inclinacion de la imagen."""
-    coords = np.column_stack(np.where(image > 0))
+    # findNonZero devuelve int32 (x, y) sin la copia int64 de np.where; se invierte a (fila, columna)
+    puntos = cv2.findNonZero(image)
     
-    if len(coords) < 100:
+    if puntos is None or len(puntos) < 100:
         return image
     
+    coords = np.ascontiguousarray(puntos[:, 0, ::-1])
+    
     angle = cv2.minAreaRect(coords)[-1]
     
     if angle < -45:
@@ -73,14 +123,19 @@ def enhance_table_detection(image):
     vertical_lines = cv2.morphologyEx(image, cv2.MORPH_OPEN, vertical_kernel)
     
     enhanced = cv2.addWeighted(image, 0.7, horizontal_lines, 0.15, 0)
-    enhanced = cv2.addWeighted(enhanced, 0.85, vertical_lines, 0.15, 0)
+    # Se escribe sobre el mismo buffer intermedio en lugar de reservar otra imagen
+    cv2.addWeighted(enhanced, 0.85, vertical_lines, 0.15, 0, dst=enhanced)
     
     return enhanced
 
 
-def prepare_image_for_ocr(pdf_page, enhance_tables=True):
-    """Pipeline completo de preprocesamiento para OCR."""
-    img = preprocess_page_for_ocr(pdf_page, zoom_factor=2.5)
+def prepare_image_for_ocr(pdf_page, enhance_tables=True, zoom_factor=None):
+    """Pipeline completo de preprocesamiento para OCR (zoom_factor=None lo elige por pagina)."""
+    if zoom_factor is None:
+        zoom_factor = select_zoom_for_page(pdf_page)
+    # Cada hilo de render reutiliza su buffer de pagina mientras el tamano no cambie
+    img = preprocess_page_for_ocr(pdf_page, zoom_factor=zoom_factor, out=getattr(_buffer_render, "imagen", None))
+    _buffer_render.imagen = img
     
     processed = apply_advanced_preprocessing(img)
     
@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+"""
+Motor de expresiones regulares para los parsers
+Usa google-re2 (tiempo lineal, sin backtracking) si está instalado y se activa con USE_RE2=1
+"""
+
+import os
+import re
+
+try:
+    import re2 as re_engine
+except ImportError:
+    re_engine = None
+
+# Se activa solo de forma explícita: re2 trata \s, \d y \b como ASCII y no soporta lookaround
+USAR_RE2 = re_engine is not None and os.environ.get("USE_RE2", "0").lower() in ("1", "true", "si", "sí")
+
+# Banderas de re que se traducen a banderas en línea de re2
+BANDERAS_EN_LINEA = (
+    (re.IGNORECASE, "i"),
+    (re.MULTILINE, "m"),
+    (re.DOTALL, "s"),
+)
+
+
+def compilar_patron(patron, banderas=0):
+    """
+    Compila un patrón con re2 cuando está activo.
+    Si re2 no soporta el patrón o las banderas, se usa el re estándar.
+    """
+    if not USAR_RE2:
+        return re.compile(patron, banderas)
+
+    prefijo = ""
+    banderas_restantes = banderas
+    for bandera, letra in BANDERAS_EN_LINEA:
+        if banderas & bandera:
+            prefijo += letra
+            banderas_restantes &= ~bandera
+
+    # Banderas sin equivalente en re2 (VERBOSE, ASCII...): se queda con re
+    if banderas_restantes:
+        return re.compile(patron, banderas)
+
+    try:
+        return re_engine.compile(f"(?{prefijo}){patron}" if prefijo else patron)
+    except Exception:
+        # Lookbehind, lookahead y backreferences no existen en re2
+        return re.compile(patron, banderas)